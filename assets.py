@@ -1,3 +1,5 @@
+from collections import OrderedDict
+
 import pygame
 
 color = {
@@ -10,34 +12,44 @@ color = {
     'white'         : (255, 255, 255)
 }
 
-piecesImg = pygame.image.load('chessPieces/pieces.png')
+piecesImgPath = 'chessPieces/pieces.png'
 imageWidth = 333
 imageHeight = 333
 
-whiteKing   = piecesImg.subsurface((0 * imageWidth, 0 * imageHeight, imageWidth, imageHeight))
-whitePawn   = piecesImg.subsurface((5 * imageWidth, 0 * imageHeight, imageWidth, imageHeight))
-whiteKnight = piecesImg.subsurface((3 * imageWidth, 0 * imageHeight, imageWidth, imageHeight))
-whiteBishop = piecesImg.subsurface((2 * imageWidth, 0 * imageHeight, imageWidth, imageHeight))
-whiteRook   = piecesImg.subsurface((4 * imageWidth, 0 * imageHeight, imageWidth, imageHeight))
-whiteQueen  = piecesImg.subsurface((1 * imageWidth, 0 * imageHeight, imageWidth, imageHeight))
-blackKing   = piecesImg.subsurface((0 * imageWidth, 1 * imageHeight, imageWidth, imageHeight))
-blackPawn   = piecesImg.subsurface((5 * imageWidth, 1 * imageHeight, imageWidth, imageHeight))
-blackKnight = piecesImg.subsurface((3 * imageWidth, 1 * imageHeight, imageWidth, imageHeight))
-blackBishop = piecesImg.subsurface((2 * imageWidth, 1 * imageHeight, imageWidth, imageHeight))
-blackRook   = piecesImg.subsurface((4 * imageWidth, 1 * imageHeight, imageWidth, imageHeight))
-blackQueen  = piecesImg.subsurface((1 * imageWidth, 1 * imageHeight, imageWidth, imageHeight))
-
-pieceNumberToImage = {
-    0: whiteKing,
-    1: whitePawn,
-    2: whiteKnight,
-    3: whiteBishop,
-    4: whiteRook,
-    5: whiteQueen,
-    6: blackKing,
-    7: blackPawn,
-    8: blackKnight,
-    9: blackBishop,
-    10: blackRook,
-    11: blackQueen
-}
\ No newline at end of file
+# column of each piece in pieces.png, ordered like board.pieceLists (king, pawn, knight, bishop, rook, queen)
+# the first row holds the white pieces and the second row the black pieces
+pieceColumns = [0, 5, 3, 2, 4, 1]
+
+pieceNumberToImage = {}
+
+# the sprite sheet is only decoded when the first piece is drawn, so importing the colors stays cheap
+def getPieceImages():
+    if not pieceNumberToImage:
+        piecesImg = pygame.image.load(piecesImgPath)
+        for pieceNumber in range(12):
+            row, column = pieceNumber // 6, pieceColumns[pieceNumber % 6]
+            pieceNumberToImage[pieceNumber] = piecesImg.subsurface((column * imageWidth, row * imageHeight, imageWidth, imageHeight))
+    return pieceNumberToImage
+
+scaledSpriteCacheSize = 4   # tile sizes kept scaled, so dragging back and forth between sizes doesn't rescale
+scaledSprites = OrderedDict()   # tile size -> the 12 pieces as subsurfaces of one scaled atlas, least recently used first
+
+# the whole sprite sheet is scaled once per tile size into an atlas and the pieces are cut out of it
+def getScaledPieceImages(tileSize):
+    if tileSize in scaledSprites:
+        scaledSprites.move_to_end(tileSize)
+        return scaledSprites[tileSize]
+
+    sheet = getPieceImages()[0].get_parent().subsurface((0, 0, len(pieceColumns) * imageWidth, 2 * imageHeight))
+    atlas = pygame.transform.scale(sheet, (len(pieceColumns) * tileSize, 2 * tileSize))
+    if pygame.display.get_surface() is not None:
+        atlas = atlas.convert_alpha()   # the display's pixel format, so blitting doesn't convert every frame
+    images = []
+    for pieceNumber in range(12):
+        row, column = pieceNumber // 6, pieceColumns[pieceNumber % 6]
+        images.append(atlas.subsurface((column * tileSize, row * tileSize, tileSize, tileSize)))
+
+    scaledSprites[tileSize] = images
+    if len(scaledSprites) > scaledSpriteCacheSize:
+        scaledSprites.popitem(last=False)
+    return images
@@ -0,0 +1,72 @@
+import threading
+
+import moveEncoding
+import search
+
+# runs the AI's search on a worker thread over a copy of the game, so the window stays responsive.
+# the owner polls result() instead of blocking. after the AI moves it can ponder: search the position after
+# the reply it expects, without a time limit, and hand that search the clock if the player does play it
+class BackgroundSearch:
+    def __init__(self):
+        self.thread = None
+        self.searcher = None
+        self.searchBoard = None
+        self.finishedResult = None
+        self.ponderMove = moveEncoding.noMove
+        self.ponderTimeLimit = None
+
+    def start(self, chessBoard):
+        self.cancel()
+        self.run(chessBoard.searchCopy(), chessBoard.aiSearchLimits)
+
+    # searches the reply to ponderMove (the AI's expected move for the player) while the player thinks
+    def startPondering(self, chessBoard, ponderMove):
+        self.cancel()
+        searchBoard = chessBoard.searchCopy()
+        searchBoard.makeMove(ponderMove)
+        limits = dict(chessBoard.aiSearchLimits)
+        self.ponderTimeLimit = limits.pop('maxTime', None)
+        self.ponderMove = ponderMove
+        self.run(searchBoard, limits)
+
+    def run(self, searchBoard, limits):
+        self.searchBoard = searchBoard
+        self.searcher = search.Searcher(searchBoard, **limits)
+        self.thread = threading.Thread(target=self.searchInBackground, args=(self.searcher,), daemon=True)
+        self.thread.start()
+
+    def searchInBackground(self, searcher):
+        self.finishedResult = searcher.board.searchAIMove(searcher)
+
+    # the player has moved on chessBoard. a ponder hit keeps the running search going on the normal clock
+    def playerMoved(self, chessBoard, playedMove):
+        if self.isPondering() and playedMove == self.ponderMove:
+            self.ponderMove = moveEncoding.noMove
+            self.searcher.setTimeLimit(self.ponderTimeLimit)
+        else:
+            self.start(chessBoard)
+
+    def isPondering(self):
+        return self.thread is not None and self.ponderMove != moveEncoding.noMove
+
+    def isThinking(self):
+        return self.thread is not None and self.ponderMove == moveEncoding.noMove
+
+    # the finished search's result once (None while still searching), the table the search used is handed back
+    # to chessBoard since a parallel search may have swapped it for a shared one
+    def result(self, chessBoard):
+        if not self.isThinking() or self.thread.is_alive():
+            return None
+        self.thread = None
+        chessBoard.transpositionTable = self.searchBoard.transpositionTable
+        result, self.finishedResult = self.finishedResult, None
+        return result
+
+    def cancel(self):
+        if self.thread is not None:
+            self.searcher.stop()
+            self.thread.join()
+        self.thread = None
+        self.searcher = None
+        self.finishedResult = None
+        self.ponderMove = moveEncoding.noMove
@@ -0,0 +1,115 @@
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import sys
+import time
+
+import moveEncoding
+import search
+import transpositionTable
+
+# analyses every position of a FEN/EPD file with a pool of headless engines. lines are read as jobs are
+# handed out and results written as they come back, so memory stays flat however long the file is
+
+workerBoard = None  # one board (and transposition table) per pool process, reused for every job
+
+def startWorker(hashSizeMB):
+    global workerBoard
+    import gameBoard    # gameBoard imports search, keep the import out of the parent's module load
+
+    workerBoard = gameBoard.board(False)
+    workerBoard.transpositionTable = transpositionTable.TranspositionTable(hashSizeMB) if hashSizeMB > 0 else None
+
+# a FEN, or an EPD record whose operations (bm e4; id "x"; hmvc 3; ...) come after the fourth field.
+# returns the position as a FEN and the operations as a dict of opcode -> operand string
+def parsePositionLine(line):
+    fields = line.split(maxsplit=4)
+    if len(fields) < 5 or all(field.isdigit() for field in fields[4].split()[:2]):
+        return line.strip(), {}
+
+    operations = {}
+    for operation in fields[4].split(';'):
+        if operation.strip():
+            opcode, _, operand = operation.strip().partition(' ')
+            operations[opcode] = operand.strip().strip('"')
+    clocks = f"{operations.get('hmvc', 0)} {operations.get('fmvn', 1)}"
+    return ' '.join(fields[:4]) + ' ' + clocks, operations
+
+# (line number, fen, operations) for every position in the file, blank lines and # comments skipped
+def readPositions(path):
+    with (sys.stdin if path == '-' else open(path)) as positionFile:
+        for lineNumber, line in enumerate(positionFile, 1):
+            if line.strip() and not line.lstrip().startswith('#'):
+                yield lineNumber, *parsePositionLine(line)
+
+# runs in a pool process. the table is cleared so a result doesn't depend on which jobs the worker ran before
+def analyzePosition(lineNumber, fen, operations, limits):
+    analysis = {'line': lineNumber, 'fen': fen}
+    if 'id' in operations:
+        analysis['id'] = operations['id']
+    try:
+        workerBoard.initBoard(fen)
+    except ValueError as error:
+        analysis['error'] = str(error)
+        return analysis
+    if workerBoard.transpositionTable is not None:
+        workerBoard.transpositionTable.clear()
+
+    # whatever goes wrong in one position is written out with it, so the rest of the file still gets analysed
+    try:
+        result = search.Searcher(workerBoard, **limits).search()
+    except Exception as error:
+        analysis['error'] = f"{type(error).__name__}: {error}"
+        return analysis
+    analysis.update({
+        'bestMove': moveEncoding.moveToString(result.bestMove) if result.bestMove != moveEncoding.noMove else None,
+        'score': result.score,
+        'depth': result.depth,
+        'nodes': result.nodes,
+        'qnodes': result.qnodes,
+        'time': round(result.elapsed, 3),
+        'pv': [moveEncoding.moveToString(pvMove) for pvMove in result.principalVariation]
+    })
+    if 'bm' in operations:
+        analysis['expected'] = operations['bm']
+    return analysis
+
+# yields results in the order they finish (each carries its line number). at most jobsInFlight positions
+# are read ahead of the workers
+def analyzePositions(positions, limits, nWorkers, hashSizeMB=transpositionTable.defaultSizeMB, jobsInFlight=None):
+    jobsInFlight = jobsInFlight or 2 * nWorkers
+    with concurrent.futures.ProcessPoolExecutor(nWorkers, initializer=startWorker, initargs=(hashSizeMB,)) as executor:
+        pending = set()
+        for lineNumber, fen, operations in positions:
+            if len(pending) >= jobsInFlight:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+            pending.add(executor.submit(analyzePosition, lineNumber, fen, operations, limits))
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Search every position of a FEN/EPD file with a pool of engines, one JSON line per position')
+    parser.add_argument('positions', help='FEN/EPD file, one position per line, - for stdin')
+    parser.add_argument('--output', default='-', help='JSON lines file, stdout by default')
+    parser.add_argument('--depth', type=int, default=search.maxSearchDepth)
+    parser.add_argument('--nodes', type=int, default=None)
+    parser.add_argument('--time', type=float, default=None, help='seconds per position')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--hash', type=float, default=transpositionTable.defaultSizeMB, help='transposition table size in MB per worker, 0 for none')
+    args = parser.parse_args()
+    if args.depth == search.maxSearchDepth and args.nodes is None and args.time is None:
+        args.depth = 4
+
+    limits = {'maxDepth': args.depth, 'maxNodes': args.nodes, 'maxTime': args.time}
+    startTime = time.perf_counter()
+    nPositions = nErrors = 0
+    with (sys.stdout if args.output == '-' else open(args.output, 'w')) as outputFile:
+        for analysis in analyzePositions(readPositions(args.positions), limits, args.workers, args.hash):
+            outputFile.write(json.dumps(analysis) + '\n')
+            outputFile.flush()
+            nPositions += 1
+            nErrors += 'error' in analysis
+    elapsed = time.perf_counter() - startTime
+    print(f"{nPositions} positions ({nErrors} errors) in {elapsed:.2f}s, {nPositions / elapsed:.2f} positions/s", file=sys.stderr)
@@ -0,0 +1,167 @@
+import argparse
+import time
+
+import batchPerft
+import bitboards
+import evaluation
+import numpy as np
+import piece
+
+# scores many positions at once. positions come as an (N, 64) uint8 array in board.board's encoding
+# (piece.white | piece.pawn etc, a8 first) and every term is a numpy operation over the whole batch
+
+doubledPawnPenalty = 15
+isolatedPawnPenalty = 10
+# centipawns per square a piece can move to
+mobilityWeights = {piece.knight: 4, piece.bishop: 5, piece.rook: 2, piece.queen: 1}
+sliderDirections = [(piece.bishop, bitboards.bishopDirections), (piece.rook, bitboards.rookDirections),
+                    (piece.queen, bitboards.rookDirections + bitboards.bishopDirections)]
+
+def buildPieceCodeTable(scoreTables):
+    table = np.zeros((piece.black | piece.queen + 1, 64), dtype=np.int32)
+    for pieceType in range(piece.king, piece.queen+1):
+        table[piece.white | pieceType] = scoreTables[pieceType-1]
+        table[piece.black | pieceType] = scoreTables[pieceType+5]
+    return table
+
+# evaluation's signed score tables indexed by piece code instead of piece list index
+middlegameTable = buildPieceCodeTable(evaluation.middlegameScores)
+endgameTable = buildPieceCodeTable(evaluation.endgameScores)
+phaseTable = np.zeros(piece.black | piece.queen + 1, dtype=np.int32)
+for pieceType in range(piece.king, piece.queen+1):
+    phaseTable[piece.white | pieceType] = phaseTable[piece.black | pieceType] = evaluation.phaseWeights[pieceType-1]
+
+squareIndices = np.arange(64)
+
+# (middlegame, endgame, phase) per position, the same totals the board keeps incrementally
+def pieceSquareTotals(boards):
+    middlegameScores = middlegameTable[boards, squareIndices].sum(axis=1)
+    endgameScores = endgameTable[boards, squareIndices].sum(axis=1)
+    phases = phaseTable[boards].sum(axis=1)
+    return middlegameScores, endgameScores, phases
+
+def taperedScores(middlegameScores, endgameScores, phases):
+    phases = np.minimum(phases, evaluation.maxPhase)
+    return (middlegameScores * phases + endgameScores * (evaluation.maxPhase - phases)) // evaluation.maxPhase
+
+# doubled and isolated pawns for one color, as a penalty per position
+def pawnStructurePenalty(boards, pawnCode):
+    pawnsPerFile = (boards == pawnCode).reshape(-1, 8, 8).sum(axis=1)
+    doubled = np.maximum(pawnsPerFile - 1, 0).sum(axis=1)
+    hasPawns = pawnsPerFile > 0
+    neighbours = np.zeros_like(hasPawns)
+    neighbours[:, 1:] |= hasPawns[:, :-1]
+    neighbours[:, :-1] |= hasPawns[:, 1:]
+    isolated = (pawnsPerFile * ~neighbours).sum(axis=1)
+    return doubled * doubledPawnPenalty + isolated * isolatedPawnPenalty
+
+# (N,) uint64 bitboards of the squares where mask (N, 64) is set, square index = bit index like bitboards.py
+def maskToBitboards(mask):
+    return np.packbits(mask, axis=1, bitorder='little').view('<u8')[:, 0].astype(np.uint64)
+
+# pseudo-legal moves of the knights, bishops, rooks and queens of one color, weighted per piece type. for one
+# piece type and one direction (or knight jump) a square is reached by at most one piece, so popcounts of the
+# set-wise Kogge-Stone targets are exact move counts
+def mobilityScore(boards, color):
+    empty = maskToBitboards(boards == piece.none)
+    notOwn = ~maskToBitboards((boards & color) != 0)
+    knights = maskToBitboards(boards == color | piece.knight)
+    mobility = np.zeros(len(boards), dtype=np.int64)
+    for df, dr in piece.knightMovementDirections:
+        mobility += mobilityWeights[piece.knight] * batchPerft.popCount(batchPerft.shift(knights, df, dr) & notOwn)
+    for pieceType, directions in sliderDirections:
+        sliders = maskToBitboards(boards == color | pieceType)
+        for df, dr in directions:
+            mobility += mobilityWeights[pieceType] * batchPerft.popCount(batchPerft.slidingAttacks(sliders, empty, df, dr) & notOwn)
+    return mobility
+
+# N scores in centipawns, from white's point of view unless whiteToMove (N bools) is given
+def evaluateBatch(boards, whiteToMove=None):
+    boards = np.asarray(boards, dtype=np.uint8)
+    scores = taperedScores(*pieceSquareTotals(boards))
+    scores = scores - pawnStructurePenalty(boards, piece.white | piece.pawn) + pawnStructurePenalty(boards, piece.black | piece.pawn)
+    scores = scores + mobilityScore(boards, piece.white) - mobilityScore(boards, piece.black)
+    if whiteToMove is not None:
+        scores = np.where(whiteToMove, scores, -scores)
+    return scores
+
+# the same evaluation for one position (a list of 64 piece codes) in plain python with the engine's scalar
+# attack tables, what evaluating the boards one at a time costs
+def evaluatePosition(position, middlegameLists, endgameLists, phaseList):
+    middlegameScore = endgameScore = phase = 0
+    occupancy = whitePieces = 0
+    pawnsPerFile = {piece.white: [0] * 8, piece.black: [0] * 8}
+    for squareIndex, pieceCode in enumerate(position):
+        if pieceCode:
+            middlegameScore += middlegameLists[pieceCode][squareIndex]
+            endgameScore += endgameLists[pieceCode][squareIndex]
+            phase += phaseList[pieceCode]
+            occupancy |= 1 << squareIndex
+            if pieceCode & piece.white:
+                whitePieces |= 1 << squareIndex
+            if pieceCode & 7 == piece.pawn:
+                pawnsPerFile[pieceCode & ~7][squareIndex % 8] += 1
+    score = evaluation.taperedScore(middlegameScore, endgameScore, phase, True)
+
+    for color, sign in ((piece.white, -1), (piece.black, 1)):
+        files = pawnsPerFile[color]
+        doubled = sum(max(count - 1, 0) for count in files)
+        isolated = sum(count for file, count in enumerate(files) if not (file > 0 and files[file-1]) and not (file < 7 and files[file+1]))
+        score += sign * (doubled * doubledPawnPenalty + isolated * isolatedPawnPenalty)
+
+    for squareIndex, pieceCode in enumerate(position):
+        pieceType = pieceCode & 7
+        if pieceType not in mobilityWeights:
+            continue
+        if pieceType == piece.knight:
+            attacks = bitboards.knightAttackTable[squareIndex]
+        elif pieceType == piece.bishop:
+            attacks = bitboards.bishopAttacks(squareIndex, occupancy)
+        elif pieceType == piece.rook:
+            attacks = bitboards.rookAttacks(squareIndex, occupancy)
+        else:
+            attacks = bitboards.queenAttacks(squareIndex, occupancy)
+        if pieceCode & piece.white:
+            score += mobilityWeights[pieceType] * (attacks & ~whitePieces).bit_count()
+        else:
+            score -= mobilityWeights[pieceType] * (attacks & ~(occupancy & ~whitePieces)).bit_count()
+    return score
+
+if __name__ == "__main__":
+    import random
+    import gameBoard
+
+    parser = argparse.ArgumentParser(description='Time batched numpy evaluation against evaluating boards one at a time')
+    parser.add_argument('--positions', type=int, default=20000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    chessBoard = gameBoard.board(False)
+    boards = np.zeros((args.positions, 64), dtype=np.uint8)
+    scalarScores = np.zeros(args.positions, dtype=np.int64)
+    for positionIndex in range(args.positions):
+        moves = [legalMove for pieceMoves in chessBoard.legalMoves.values() for legalMove in pieceMoves]
+        if not moves or chessBoard.plyCount >= 200:
+            chessBoard.initBoard()
+        else:
+            chessBoard.makeMove(random.choice(moves))
+        boards[positionIndex] = chessBoard.board
+        scalarScores[positionIndex] = evaluation.evaluate(chessBoard) if chessBoard.whiteToMove else -evaluation.evaluate(chessBoard)
+
+    # the piece-square part has to match the board's own evaluation exactly
+    assert (taperedScores(*pieceSquareTotals(boards)) == scalarScores).all()
+
+    # both paths compute the same terms, timed against each other
+    middlegameLists, endgameLists, phaseList = middlegameTable.tolist(), endgameTable.tolist(), phaseTable.tolist()
+    positions = boards.tolist()
+    startTime = time.perf_counter()
+    loopScores = [evaluatePosition(position, middlegameLists, endgameLists, phaseList) for position in positions]
+    scalarElapsed = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    batchScores = evaluateBatch(boards)
+    batchElapsed = time.perf_counter() - startTime
+    assert (batchScores == np.array(loopScores)).all()
+
+    print(f"one board at a time {args.positions / scalarElapsed:>12.0f} positions/s")
+    print(f"batched             {args.positions / batchElapsed:>12.0f} positions/s  ({scalarElapsed / batchElapsed:.0f}x)")
@@ -0,0 +1,296 @@
+import argparse
+import time
+
+import bitboards
+import gameBoard
+import numpy as np
+import piece
+
+# many positions held as stacked uint64 bitboards, with attack sets and legal move counts computed by
+# numpy shifts and masks over the whole batch at once.
+# every position is first turned so the side to move plays white: black to move positions have their
+# ranks flipped (a byte swap of each bitboard) and colors exchanged. after that white pawns always move
+# towards rank 0 and one code path counts everything.
+# for a fixed direction (or knight jump, or pawn move) every target square is reached by at most one piece,
+# so popcounts of the set-wise targets are exact move counts without looking at pieces one by one
+
+king, pawn, knight, bishop, rook, queen = range(6)    # bitboard index within one color, like board.pieceLists
+
+fileA = np.uint64(0x0101010101010101)
+fileB = np.uint64(0x0202020202020202)
+fileG = np.uint64(0x4040404040404040)
+fileH = np.uint64(0x8080808080808080)
+promotionRank = np.uint64(0xff)             # rank 0, white's last rank
+doublePushRank = np.uint64(0xff << 40)      # where a single push from white's starting rank lands
+noBits = np.uint64(0)
+
+def shiftMask(df):
+    return {-2: ~(fileG | fileH), -1: ~fileH, 0: ~noBits, 1: ~fileA, 2: ~(fileA | fileB)}[df]
+
+def rawShift(bitboardArray, step):
+    return bitboardArray << np.uint64(step) if step > 0 else bitboardArray >> np.uint64(-step)
+
+# moves every set bit by (df, dr) with bits that would wrap around the board dropped
+def shift(bitboardArray, df, dr):
+    return rawShift(bitboardArray, dr*8 + df) & shiftMask(df)
+
+# Kogge-Stone fill: the sliders plus every square they reach through empty squares in one direction
+def occludedFill(sliders, empty, df, dr):
+    step = dr*8 + df
+    propagator = empty & shiftMask(df)
+    sliders = sliders | (propagator & rawShift(sliders, step))
+    propagator = propagator & rawShift(propagator, step)
+    sliders = sliders | (propagator & rawShift(sliders, 2*step))
+    propagator = propagator & rawShift(propagator, 2*step)
+    return sliders | (propagator & rawShift(sliders, 4*step))
+
+def slidingAttacks(sliders, empty, df, dr):
+    return shift(occludedFill(sliders, empty, df, dr), df, dr)
+
+if hasattr(np, 'bitwise_count'):
+    def popCount(bitboardArray):
+        return np.bitwise_count(bitboardArray).astype(np.int64)
+else:
+    def popCount(bitboardArray):
+        x = bitboardArray - ((bitboardArray >> np.uint64(1)) & np.uint64(0x5555555555555555))
+        x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+        x = (x + (x >> np.uint64(4))) & np.uint64(0x0f0f0f0f0f0f0f0f)
+        return ((x * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+# index of the single set bit, exact because powers of two are exact floats
+def bitIndex(bitboardArray):
+    return np.log2(np.maximum(bitboardArray, np.uint64(1)).astype(np.float64)).astype(np.int64)
+
+betweenArray = np.array(bitboards.betweenTable, dtype=np.uint64)
+whitePawnCaptureDirections = [(-1,-1), (1,-1)]
+allDirections = bitboards.rookDirections + bitboards.bishopDirections
+
+def isDiagonal(df, dr):
+    return df != 0 and dr != 0
+
+def flipRanks(bitboardArray):
+    return bitboardArray.byteswap()
+
+class PositionBatch:
+    def __init__(self, pieces, whiteToMove, castlingRights, enPassantSquares):
+        self.pieces = np.asarray(pieces, dtype=np.uint64).reshape(-1, 12)   # board.bitboards[:12] per position
+        self.whiteToMove = np.asarray(whiteToMove, dtype=bool)
+        self.castlingRights = np.asarray(castlingRights, dtype=np.uint8)
+        self.enPassantSquares = np.asarray(enPassantSquares, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.pieces)
+
+    def fromBoards(chessBoards):
+        return PositionBatch([chessBoard.bitboards[:12] for chessBoard in chessBoards],
+                             [chessBoard.whiteToMove for chessBoard in chessBoards],
+                             [chessBoard.castlingRights.rights for chessBoard in chessBoards],
+                             [chessBoard.enPassantSquare for chessBoard in chessBoards])
+
+    def fromFens(fens):
+        chessBoard = gameBoard.board(False)
+        pieces, whiteToMove, castlingRights, enPassantSquares = [], [], [], []
+        for fen in fens:
+            chessBoard.initBoard(fen)
+            pieces.append(chessBoard.bitboards[:12].copy())
+            whiteToMove.append(chessBoard.whiteToMove)
+            castlingRights.append(chessBoard.castlingRights.rights)
+            enPassantSquares.append(chessBoard.enPassantSquare)
+        return PositionBatch(pieces, whiteToMove, castlingRights, enPassantSquares)
+
+    # (our pieces, their pieces, our castling rights, en passant square) with the side to move as white
+    def sideToMoveAsWhite(self):
+        flipped = ~self.whiteToMove[:, None]
+        white, black = self.pieces[:, :6], self.pieces[:, 6:]
+        us = np.where(flipped, flipRanks(black), white)
+        them = np.where(flipped, flipRanks(white), black)
+        castlingRights = np.where(self.whiteToMove, self.castlingRights, self.castlingRights >> 2) & 3
+        enPassantSquares = np.where((self.enPassantSquares >= 0) & ~self.whiteToMove, self.enPassantSquares ^ 56, self.enPassantSquares)
+        return us, them, castlingRights, enPassantSquares
+
+# every square attacked by black's pieces ("them" after turning the batch), sliders see through emptySquares
+def attackedByBlack(them, emptySquares):
+    attacks = shift(them[:, pawn], -1, 1) | shift(them[:, pawn], 1, 1)
+    for df, dr in piece.knightMovementDirections:
+        attacks |= shift(them[:, knight], df, dr)
+    for df, dr in bitboards.kingMovementDirections:
+        attacks |= shift(them[:, king], df, dr)
+    for df, dr in allDirections:
+        sliders = them[:, queen] | (them[:, bishop] if isDiagonal(df, dr) else them[:, rook])
+        attacks |= slidingAttacks(sliders, emptySquares, df, dr)
+    return attacks
+
+# the squares each position's side to move attacks, one bitboard per position
+def attackSets(batch):
+    us, them, _, _ = batch.sideToMoveAsWhite()
+    emptySquares = ~np.bitwise_or.reduce(np.concatenate([us, them], axis=1), axis=1)
+    # attacks of our pieces are black's attacks with the board turned over once more
+    attacks = attackedByBlack(flipRanks(us), flipRanks(emptySquares))
+    return np.where(batch.whiteToMove, flipRanks(attacks), attacks)
+
+# black pieces attacking the given (single square) bitboards
+def attackersOf(squares, them, emptySquares):
+    attackers = (shift(squares, -1, -1) | shift(squares, 1, -1)) & them[:, pawn]
+    knightSquares = noBits
+    for df, dr in piece.knightMovementDirections:
+        knightSquares = knightSquares | shift(squares, df, dr)
+    attackers |= knightSquares & them[:, knight]
+    for df, dr in allDirections:
+        sliders = them[:, queen] | (them[:, bishop] if isDiagonal(df, dr) else them[:, rook])
+        attackers |= slidingAttacks(squares, emptySquares, df, dr) & sliders
+    return attackers
+
+# moves of the given pieces whose targets fall in targetMask, promotions count four times
+def countPieceMoves(us, them, pieceSets, emptySquares, targetMask):
+    notUs = ~np.bitwise_or.reduce(us, axis=1)
+    count = np.zeros(len(us), dtype=np.int64)
+    for df, dr in piece.knightMovementDirections:
+        count += popCount(shift(pieceSets[:, knight], df, dr) & notUs & targetMask)
+    for df, dr in allDirections:
+        sliders = pieceSets[:, queen] | (pieceSets[:, bishop] if isDiagonal(df, dr) else pieceSets[:, rook])
+        count += popCount(slidingAttacks(sliders, emptySquares, df, dr) & notUs & targetMask)
+
+    pawns = pieceSets[:, pawn]
+    singlePushes = shift(pawns, 0, -1) & emptySquares
+    doublePushes = shift(singlePushes & doublePushRank, 0, -1) & emptySquares & targetMask
+    pawnTargets = [singlePushes & targetMask] + [shift(pawns, df, dr) & np.bitwise_or.reduce(them, axis=1) & targetMask for df, dr in whitePawnCaptureDirections]
+    for targets in pawnTargets:
+        count += popCount(targets & ~promotionRank) + 4 * popCount(targets & promotionRank)
+    return count + popCount(doublePushes)
+
+# en passant takes two pieces off one rank, so like the scalar generator play it out and look at the king
+def countEnPassantMoves(us, them, enPassantSquares, occupancy, kingSquares):
+    hasEnPassant = enPassantSquares >= 0
+    enPassantBits = np.where(hasEnPassant, np.uint64(1) << np.maximum(enPassantSquares, 0).astype(np.uint64), noBits)
+    capturedPawns = shift(enPassantBits, 0, 1)
+    count = np.zeros(len(us), dtype=np.int64)
+    for df, dr in whitePawnCaptureDirections:
+        capturingPawns = shift(enPassantBits, -df, -dr) & us[:, pawn]
+        emptyAfter = ~((occupancy ^ capturingPawns ^ capturedPawns) | enPassantBits)
+        themAfter = them.copy()
+        themAfter[:, pawn] &= ~capturedPawns
+        legal = (capturingPawns != 0) & (attackersOf(kingSquares, themAfter, emptyAfter) == 0)
+        count += legal
+    return count
+
+def castlingMoves(occupancy, attacked, castlingRights, inCheck):
+    kingSide = ((castlingRights & 1) != 0) & ((occupancy & np.uint64(0x6 << 60)) == 0) & ((attacked & np.uint64(0x7 << 60)) == 0)
+    queenSide = ((castlingRights & 2) != 0) & ((occupancy & np.uint64(0xe << 56)) == 0) & ((attacked & np.uint64(0x1c << 56)) == 0)
+    return np.where(inCheck, 0, kingSide.astype(np.int64) + queenSide.astype(np.int64))
+
+# the number of legal moves in every position of the batch, the same count as board.generateLegalMoves
+def countLegalMoves(batch):
+    us, them, castlingRights, enPassantSquares = batch.sideToMoveAsWhite()
+    ourPieces = np.bitwise_or.reduce(us, axis=1)
+    occupancy = ourPieces | np.bitwise_or.reduce(them, axis=1)
+    emptySquares = ~occupancy
+    kings = us[:, king]
+    kingSquares = bitIndex(kings)
+
+    # king moves, with the king itself out of the way of the attacks
+    attackedWithoutKing = attackedByBlack(them, emptySquares | kings)
+    count = np.zeros(len(batch), dtype=np.int64)
+    for df, dr in bitboards.kingMovementDirections:
+        count += popCount(shift(kings, df, dr) & ~ourPieces & ~attackedWithoutKing)
+
+    checkers = attackersOf(kings, them, emptySquares)
+    nCheckers = popCount(checkers)
+    checkMask = np.where(nCheckers == 0, ~noBits, noBits)
+    singleCheck = nCheckers == 1
+    checkMask = np.where(singleCheck, checkers | betweenArray[kingSquares, bitIndex(checkers)], checkMask)
+
+    # a friendly piece between the king and an enemy slider on the same line can only move along that line
+    pinned = np.zeros(len(batch), dtype=np.uint64)
+    pinnedMoves = np.zeros(len(batch), dtype=np.int64)
+    for df, dr in allDirections:
+        sliders = them[:, queen] | (them[:, bishop] if isDiagonal(df, dr) else them[:, rook])
+        firstBlockers = slidingAttacks(kings, emptySquares, df, dr) & ourPieces
+        rays = slidingAttacks(kings, emptySquares | firstBlockers, df, dr)
+        pinnedHere = np.where((rays & sliders) != 0, firstBlockers, noBits)
+        if not pinnedHere.any():
+            continue
+        pinned |= pinnedHere
+        pinnedMoves += countPieceMoves(us, them, us & pinnedHere[:, None], emptySquares, checkMask & rays)
+
+    count += pinnedMoves + countPieceMoves(us, them, us & ~pinned[:, None], emptySquares, checkMask)
+    count += countEnPassantMoves(us, them, enPassantSquares, occupancy, kings)
+    count += castlingMoves(occupancy, attackedWithoutKing, castlingRights, nCheckers > 0)
+    return count
+
+# the scalar generator walks every ply but the last, the positions one ply above the leaves of every
+# fen are stacked and their moves counted in one batch. returns one node count per fen
+def perftFens(fens, depth):
+    if depth == 0:
+        return np.ones(len(fens), dtype=np.int64)
+    chessBoard = gameBoard.board(False)
+    frontier = []
+    frontierStarts = []
+    for fen in fens:
+        chessBoard.initBoard(fen)
+        frontierStarts.append(len(frontier))
+        collectFrontier(chessBoard, depth-1, 1, frontier)
+    if not frontier:
+        return np.zeros(len(fens), dtype=np.int64)
+
+    pieces, whiteToMove, castlingRights, enPassantSquares = zip(*frontier)
+    counts = countLegalMoves(PositionBatch(pieces, whiteToMove, castlingRights, enPassantSquares))
+    # a fen whose tree ends before the frontier (mate or stalemate) owns an empty slice
+    boundaries = np.array(frontierStarts + [len(frontier)])
+    cumulative = np.concatenate([[0], np.cumsum(counts)])
+    return cumulative[boundaries[1:]] - cumulative[boundaries[:-1]]
+
+def perft(fen, depth):
+    return int(perftFens([fen], depth)[0])
+
+def collectFrontier(chessBoard, depth, ply, frontier):
+    if depth == 0:
+        frontier.append((chessBoard.bitboards[:12].copy(), chessBoard.whiteToMove, chessBoard.castlingRights.rights, chessBoard.enPassantSquare))
+        return
+    nMoves = chessBoard.generateLegalMoves(ply)
+    moveBuffer = chessBoard.moveBuffers[ply]
+    for moveIndex in range(nMoves):
+        chessBoard.makeMove(moveBuffer[moveIndex])
+        collectFrontier(chessBoard, depth-1, ply+1, frontier)
+        chessBoard.unmakeMove()
+
+def readEpd(path):
+    with open(path) as epdFile:
+        return [' '.join(line.split()[:4]) for line in epdFile if line.strip() and not line.startswith('#')]
+
+if __name__ == "__main__":
+    import perft as scalarPerft
+
+    parser = argparse.ArgumentParser(description='Count legal moves and leaf perft for many positions at once, cross-checked against the scalar generator')
+    parser.add_argument('--epd', help='file of FEN/EPD positions, one per line, defaults to the perft suite')
+    parser.add_argument('--depth', type=int, default=1)
+    parser.add_argument('--max-nodes', type=int, default=50000, help='suite only, deepest depth whose known count fits in this')
+    args = parser.parse_args()
+
+    if args.epd:
+        fens = readEpd(args.epd)
+        startTime = time.perf_counter()
+        batch = PositionBatch.fromFens(fens)
+        loadTime = time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        counts = countLegalMoves(batch) if args.depth == 1 else perftFens(fens, args.depth)
+        batchTime = time.perf_counter() - startTime
+
+        startTime = time.perf_counter()
+        scalarCounts = np.array([scalarPerft.perft(gameBoard.board(False, fen), args.depth) for fen in fens])
+        scalarTime = time.perf_counter() - startTime
+        mismatches = np.flatnonzero(counts != scalarCounts)
+        for index in mismatches:
+            print(f"mismatch {fens[index]}: batch {counts[index]} scalar {scalarCounts[index]}")
+        print(f"{len(fens)} positions loaded in {loadTime:.2f}s, depth {args.depth}: batch {batchTime:.2f}s, scalar {scalarTime:.2f}s, mismatches {len(mismatches)}")
+        raise SystemExit(1 if len(mismatches) else 0)
+
+    failures = 0
+    for name, fen, knownCounts in scalarPerft.perftSuite:
+        depth = max([d for d, count in enumerate(knownCounts, 1) if count <= args.max_nodes] or [1])
+        startTime = time.perf_counter()
+        nodes = perft(fen, depth)
+        elapsed = time.perf_counter() - startTime
+        passed = nodes == knownCounts[depth-1]
+        failures += not passed
+        print(f"{name:<24} depth {depth}  nodes {nodes:>9}  expected {knownCounts[depth-1]:>9}  {scalarPerft.nodesPerSecond(nodes, elapsed):>8} nps  {'ok' if passed else 'FAIL'}")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,178 @@
+import argparse
+import os
+import pickle
+import random
+
+import piece
+import util
+
+rookDirections = [(-1,0),(1,0),(0,-1),(0,1)]
+bishopDirections = [(-1,-1),(-1,1),(1,-1),(1,1)]
+
+def squareBit(squareIndex):
+    return 1 << squareIndex
+
+def iterateBits(bitboard):
+    while bitboard:
+        leastSignificantBit = bitboard & -bitboard
+        yield leastSignificantBit.bit_length() - 1
+        bitboard ^= leastSignificantBit
+
+def popCount(bitboard):
+    return bitboard.bit_count()
+
+def raySquares(squareIndex, df, dr):
+    file,rank = util.squareIndexToRelativeCoordinate(squareIndex)
+    squares = []
+    currentFile,currentRank = file+df,rank+dr
+    while util.fileRankInbounds(currentFile, currentRank):
+        squares.append(util.relativeCoordinatesToSquareIndex((currentFile, currentRank)))
+        currentFile += df
+        currentRank += dr
+    return squares
+
+# reference ray walk the lookup tables are checked against, see __main__
+def slidingAttacksByRayWalk(squareIndex, occupancy, directions):
+    attacks = 0
+    for df,dr in directions:
+        for currentSquare in raySquares(squareIndex, df, dr):
+            attacks |= squareBit(currentSquare)
+            if occupancy & squareBit(currentSquare):
+                break
+    return attacks
+
+def enumerateSubsets(mask):
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask     # carry-rippler trick
+        if subset == 0:
+            break
+
+# the edge square of a ray never changes the attack set, so it is left out of the mask
+def buildRayLookup(squares):
+    relevantMask = 0
+    for currentSquare in squares[:-1]:
+        relevantMask |= squareBit(currentSquare)
+
+    lookup = {}
+    for blockers in enumerateSubsets(relevantMask):
+        attacks = 0
+        for currentSquare in squares:
+            attacks |= squareBit(currentSquare)
+            if blockers & squareBit(currentSquare):
+                break
+        lookup[blockers] = attacks
+    return relevantMask, lookup
+
+# masks[square] holds the relevant occupancy bits, tables[square] maps (occupancy & mask) -> attack set.
+# python has no pext/magic multiply worth using, so the masked occupancy itself is the dict key
+def buildSlidingAttackTable(directions):
+    masks = []
+    tables = []
+    for squareIndex in range(64):
+        rays = [buildRayLookup(raySquares(squareIndex, df, dr)) for df,dr in directions]
+        (mask0,lookup0),(mask1,lookup1),(mask2,lookup2),(mask3,lookup3) = rays
+        mask = mask0 | mask1 | mask2 | mask3
+
+        table = {}
+        for blockers in enumerateSubsets(mask):
+            table[blockers] = lookup0[blockers & mask0] | lookup1[blockers & mask1] | lookup2[blockers & mask2] | lookup3[blockers & mask3]
+        masks.append(mask)
+        tables.append(table)
+    return masks, tables
+
+# building the tables costs more than the rest of the engine's startup, so they are cached on disk
+attackTableCachePath = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__', 'attackTables.pickle')
+attackTableCacheVersion = 1
+
+def loadSlidingAttackTables():
+    try:
+        with open(attackTableCachePath, 'rb') as cacheFile:
+            version, tables = pickle.load(cacheFile)
+        if version == attackTableCacheVersion:
+            return tables
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+
+    tables = buildSlidingAttackTable(rookDirections) + buildSlidingAttackTable(bishopDirections)
+    try:
+        os.makedirs(os.path.dirname(attackTableCachePath), exist_ok=True)
+        temporaryPath = f"{attackTableCachePath}.{os.getpid()}"  # several processes may build at once
+        with open(temporaryPath, 'wb') as cacheFile:
+            pickle.dump((attackTableCacheVersion, tables), cacheFile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporaryPath, attackTableCachePath)
+    except OSError:
+        pass    # read-only install, build every time
+    return tables
+
+rookMasks, rookTables, bishopMasks, bishopTables = loadSlidingAttackTables()
+
+def rookAttacks(squareIndex, occupancy):
+    return rookTables[squareIndex][occupancy & rookMasks[squareIndex]]
+
+def bishopAttacks(squareIndex, occupancy):
+    return bishopTables[squareIndex][occupancy & bishopMasks[squareIndex]]
+
+def queenAttacks(squareIndex, occupancy):
+    return rookAttacks(squareIndex, occupancy) | bishopAttacks(squareIndex, occupancy)
+
+# board.bitboards layout: indexes 0-11 follow board.pieceToListIndex, then the occupancy boards
+whitePieces = 12
+blackPieces = 13
+allPieces = 14
+nBitboards = 15
+
+kingMovementDirections = [(df,dr) for df in [-1,0,1] for dr in [-1,0,1] if df or dr]
+
+def leaperAttacks(squareIndex, movementDirections):
+    file,rank = util.squareIndexToRelativeCoordinate(squareIndex)
+    attacks = 0
+    for df,dr in movementDirections:
+        if util.fileRankInbounds(file+df, rank+dr):
+            attacks |= squareBit(util.relativeCoordinatesToSquareIndex((file+df, rank+dr)))
+    return attacks
+
+knightAttackTable = [leaperAttacks(squareIndex, piece.knightMovementDirections) for squareIndex in range(64)]
+kingAttackTable = [leaperAttacks(squareIndex, kingMovementDirections) for squareIndex in range(64)]
+# white pawns move towards rank 0, black pawns towards rank 7
+whitePawnAttackTable = [leaperAttacks(squareIndex, [(-1,-1),(1,-1)]) for squareIndex in range(64)]
+blackPawnAttackTable = [leaperAttacks(squareIndex, [(-1,1),(1,1)]) for squareIndex in range(64)]
+
+fullBoard = (1 << 64) - 1
+
+# betweenTable[a][b] holds the squares strictly between a and b when they share a line, otherwise 0
+def buildBetweenTable():
+    table = [[0] * 64 for _ in range(64)]
+    for squareIndex in range(64):
+        for df,dr in rookDirections + bishopDirections:
+            between = 0
+            for currentSquare in raySquares(squareIndex, df, dr):
+                table[squareIndex][currentSquare] = between
+                between |= squareBit(currentSquare)
+    return table
+
+betweenTable = buildBetweenTable()
+
+# every square's rook and bishop lookups against the ray walk, over random occupancies of varying density
+def validateSlidingAttacks(samplesPerSquare, randomGenerator=random):
+    mismatches = 0
+    for squareIndex in range(64):
+        for sample in range(samplesPerSquare):
+            occupancy = randomGenerator.getrandbits(64)
+            for _ in range(sample % 4):     # and-ing more random words thins the board out
+                occupancy &= randomGenerator.getrandbits(64)
+            for lookup, directions in ((rookAttacks, rookDirections), (bishopAttacks, bishopDirections)):
+                if lookup(squareIndex, occupancy) != slidingAttacksByRayWalk(squareIndex, occupancy, directions):
+                    print(f"{lookup.__name__} mismatch on square {squareIndex} with occupancy {occupancy:016x}")
+                    mismatches += 1
+    return mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the sliding attack tables against a plain ray walk')
+    parser.add_argument('--samples', type=int, default=1000, help='random occupancies per square')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    mismatches = validateSlidingAttacks(args.samples, random.Random(args.seed))
+    print(f"{64 * args.samples * 2} lookups checked, {mismatches} mismatches")
@@ -0,0 +1,161 @@
+import argparse
+import time
+
+import piece
+
+# centipawn values indexed like board.pieceLists (king, pawn, knight, bishop, rook, queen)
+pieceValues = [piece.values[pieceType] * 100 for pieceType in range(piece.king, piece.queen+1)]
+
+# piece-square tables from white's point of view, laid out like board.board (a8 first).
+# black pieces read them mirrored across the middle of the board
+kingMiddlegameTable = [
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -30,-40,-40,-50,-50,-40,-40,-30,
+    -20,-30,-30,-40,-40,-30,-30,-20,
+    -10,-20,-20,-20,-20,-20,-20,-10,
+     20, 20,  0,  0,  0,  0, 20, 20,
+     20, 30, 10,  0,  0, 10, 30, 20,
+]
+kingEndgameTable = [
+    -50,-40,-30,-20,-20,-30,-40,-50,
+    -30,-20,-10,  0,  0,-10,-20,-30,
+    -30,-10, 20, 30, 30, 20,-10,-30,
+    -30,-10, 30, 40, 40, 30,-10,-30,
+    -30,-10, 30, 40, 40, 30,-10,-30,
+    -30,-10, 20, 30, 30, 20,-10,-30,
+    -30,-30,  0,  0,  0,  0,-30,-30,
+    -50,-30,-30,-30,-30,-30,-30,-50,
+]
+pawnMiddlegameTable = [
+      0,  0,  0,  0,  0,  0,  0,  0,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     10, 10, 20, 30, 30, 20, 10, 10,
+      5,  5, 10, 25, 25, 10,  5,  5,
+      0,  0,  0, 20, 20,  0,  0,  0,
+      5, -5,-10,  0,  0,-10, -5,  5,
+      5, 10, 10,-20,-20, 10, 10,  5,
+      0,  0,  0,  0,  0,  0,  0,  0,
+]
+pawnEndgameTable = [
+      0,  0,  0,  0,  0,  0,  0,  0,
+     90, 90, 90, 90, 90, 90, 90, 90,
+     50, 50, 50, 50, 50, 50, 50, 50,
+     30, 30, 30, 30, 30, 30, 30, 30,
+     15, 15, 15, 15, 15, 15, 15, 15,
+      5,  5,  5,  5,  5,  5,  5,  5,
+      0,  0,  0,  0,  0,  0,  0,  0,
+      0,  0,  0,  0,  0,  0,  0,  0,
+]
+knightTable = [
+    -50,-40,-30,-30,-30,-30,-40,-50,
+    -40,-20,  0,  0,  0,  0,-20,-40,
+    -30,  0, 10, 15, 15, 10,  0,-30,
+    -30,  5, 15, 20, 20, 15,  5,-30,
+    -30,  0, 15, 20, 20, 15,  0,-30,
+    -30,  5, 10, 15, 15, 10,  5,-30,
+    -40,-20,  0,  5,  5,  0,-20,-40,
+    -50,-40,-30,-30,-30,-30,-40,-50,
+]
+bishopTable = [
+    -20,-10,-10,-10,-10,-10,-10,-20,
+    -10,  0,  0,  0,  0,  0,  0,-10,
+    -10,  0,  5, 10, 10,  5,  0,-10,
+    -10,  5,  5, 10, 10,  5,  5,-10,
+    -10,  0, 10, 10, 10, 10,  0,-10,
+    -10, 10, 10, 10, 10, 10, 10,-10,
+    -10,  5,  0,  0,  0,  0,  5,-10,
+    -20,-10,-10,-10,-10,-10,-10,-20,
+]
+rookTable = [
+      0,  0,  0,  0,  0,  0,  0,  0,
+      5, 10, 10, 10, 10, 10, 10,  5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+     -5,  0,  0,  0,  0,  0,  0, -5,
+      0,  0,  0,  5,  5,  0,  0,  0,
+]
+queenTable = [
+    -20,-10,-10, -5, -5,-10,-10,-20,
+    -10,  0,  0,  0,  0,  0,  0,-10,
+    -10,  0,  5,  5,  5,  5,  0,-10,
+     -5,  0,  5,  5,  5,  5,  0, -5,
+      0,  0,  5,  5,  5,  5,  0, -5,
+    -10,  5,  5,  5,  5,  5,  0,-10,
+    -10,  0,  5,  0,  0,  0,  0,-10,
+    -20,-10,-10, -5, -5,-10,-10,-20,
+]
+# indexed like board.pieceLists' white half
+middlegameTables = [kingMiddlegameTable, pawnMiddlegameTable, knightTable, bishopTable, rookTable, queenTable]
+endgameTables = [kingEndgameTable, pawnEndgameTable, knightTable, bishopTable, rookTable, queenTable]
+
+# game phase runs from maxPhase with all pieces on the board down to 0 with only kings and pawns left
+phaseWeights = [0, 0, 1, 1, 2, 4]
+maxPhase = 24
+
+# material plus piece-square value of every piece on every square, signed so white is positive.
+# indexed [pieceListIndex][squareIndex] so the board can update its running totals with two lookups
+def buildScoreTables(tables):
+    whiteTables = [[pieceValues[i] + tables[i][squareIndex] for squareIndex in range(64)] for i in range(6)]
+    blackTables = [[-pieceValues[i] - tables[i][squareIndex ^ 56] for squareIndex in range(64)] for i in range(6)]
+    return whiteTables + blackTables
+
+middlegameScores = buildScoreTables(middlegameTables)
+endgameScores = buildScoreTables(endgameTables)
+piecePhases = phaseWeights + phaseWeights
+
+# the board's running totals from nothing, (middlegame score, endgame score, phase)
+def scratchTotals(chessBoard):
+    middlegameScore = endgameScore = phase = 0
+    for pieceListIndex, pieceList in enumerate(chessBoard.pieceLists):
+        for squareIndex in pieceList:
+            middlegameScore += middlegameScores[pieceListIndex][squareIndex]
+            endgameScore += endgameScores[pieceListIndex][squareIndex]
+            phase += piecePhases[pieceListIndex]
+    return middlegameScore, endgameScore, phase
+
+def taperedScore(middlegameScore, endgameScore, phase, whiteToMove):
+    phase = min(phase, maxPhase)    # promotions can push it past the starting material
+    score = (middlegameScore * phase + endgameScore * (maxPhase - phase)) // maxPhase
+    return score if whiteToMove else -score
+
+# blends the middlegame and endgame totals by how much material is left, from the side to move's point of view.
+# the board keeps the totals up to date as pieces move, so this is O(1)
+def evaluate(chessBoard):
+    return taperedScore(chessBoard.middlegameScore, chessBoard.endgameScore, chessBoard.gamePhase, chessBoard.whiteToMove)
+
+def evaluateFromScratch(chessBoard):
+    return taperedScore(*scratchTotals(chessBoard), chessBoard.whiteToMove)
+
+if __name__ == "__main__":
+    import random
+    import gameBoard
+
+    parser = argparse.ArgumentParser(description='Time the incremental evaluation against recomputing it from scratch')
+    parser.add_argument('--positions', type=int, default=2000)
+    parser.add_argument('--repeats', type=int, default=50, help='evaluations per position')
+    args = parser.parse_args()
+
+    # positions from random games, both evaluations have to agree on every one
+    random.seed(0)
+    chessBoard = gameBoard.board(False)
+    timings = {evaluate: 0.0, evaluateFromScratch: 0.0}
+    for _ in range(args.positions):
+        moves = [legalMove for pieceMoves in chessBoard.legalMoves.values() for legalMove in pieceMoves]
+        if not moves or chessBoard.plyCount >= 200:
+            chessBoard.initBoard()
+            continue
+        chessBoard.makeMove(random.choice(moves))
+        assert evaluate(chessBoard) == evaluateFromScratch(chessBoard)
+        for evaluationFunction in timings:
+            startTime = time.perf_counter()
+            for _ in range(args.repeats):
+                evaluationFunction(chessBoard)
+            timings[evaluationFunction] += time.perf_counter() - startTime
+
+    nEvaluations = args.positions * args.repeats
+    for evaluationFunction, elapsed in timings.items():
+        print(f"{evaluationFunction.__name__:<20} {nEvaluations / elapsed:>10.0f} evaluations/s  {elapsed / nEvaluations * 1e6:.2f} µs each")
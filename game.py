@@ -1,10 +1,17 @@
 import assets
+import backgroundSearch
 import events
 import gameBoard
+import moveEncoding
+import piece
+import promotionScreen
 import pygame
 import titleScreen
 import util
 
+aiPollInterval = 50     # milliseconds between checks for the AI's move while it thinks
+resizeSettleTime = 100  # milliseconds without another resize event before the board is rescaled
+
 class game:
     def __init__(self, width, height):
         boardSize = min(width,height)
@@ -13,57 +20,119 @@ class game:
         pygame.init()
         self.window = pygame.display.set_mode((width, height), pygame.RESIZABLE)
         pygame.display.set_caption('Chess')
-        pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN, pygame.VIDEORESIZE])
+        pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN, pygame.VIDEORESIZE, pygame.VIDEOEXPOSE])
 
         # Wait for game start, returns True if option to play vs AI selected, False otherwise
         playingAgainstAI = titleScreen.waitGameStart("Chess")
 
         self.board = gameBoard.board(playingAgainstAI)
+        self.aiSearch = backgroundSearch.BackgroundSearch()
         self.events = events.events()
         self.loadedAssets = self.loadAssets()
+        self.boardSurface = self.renderCheckerboard()
+        self.highlightedSelection = None
+        self.highlights = {}
+        self.drawnSquares = None
         self.sounds = {'pieceMove': pygame.mixer.Sound("sounds/move.mp3"),
                        'capture': pygame.mixer.Sound("sounds/capture.mp3")}
         self.running = True
+        self.needsRedraw = True
+        self.pendingResize = None
 
     def __del__(self):
         pygame.quit()
 
     def playChess(self):
-        self.drawBoard()
+        if self.needsRedraw:
+            self.drawBoard()
+            self.needsRedraw = False
         self.handleInput()
 
+    # only squares whose piece or highlight changed since the last frame are drawn and sent to the display
     def drawBoard(self):
+        highlights = self.squareHighlights()
+        fullRedraw = self.drawnSquares is None
+        if fullRedraw:
+            self.drawnSquares = [None] * 64
+
+        dirtyRects = []
+        for squareIndex in range(64):
+            squareState = (self.board.board[squareIndex], highlights.get(squareIndex))
+            if squareState != self.drawnSquares[squareIndex]:
+                dirtyRects.append(self.drawSquare(squareIndex, *squareState))
+                self.drawnSquares[squareIndex] = squareState
+
+        if fullRedraw:
+            pygame.display.flip()
+        elif dirtyRects:
+            pygame.display.update(dirtyRects)
+
+    def drawSquare(self, squareIndex, pieceOnSquare, highlight):
+        file, rank = util.squareIndexToRelativeCoordinate(squareIndex)
+        tileRect = pygame.Rect(file*self.tileSize, rank*self.tileSize, self.tileSize, self.tileSize)
+        if highlight in ('selected', 'capture'):
+            pygame.draw.rect(self.window, assets.color[highlight], tileRect)
+        else:
+            self.window.blit(self.boardSurface, tileRect, tileRect)
+        if highlight == 'legalMove':
+            pygame.draw.circle(self.window, assets.color['legalMove'], tileRect.center, self.tileSize//8)
+        if pieceOnSquare != piece.none:
+            self.window.blit(self.loadedAssets[gameBoard.board.pieceToListIndex(pieceOnSquare)], tileRect)
+        return tileRect
+
+    # square -> highlight color name for the selected square and its piece's moves, worked out once per selection
+    def squareHighlights(self):
+        selection = (self.events.squareSelected, self.board.hashKey)
+        if selection != self.highlightedSelection:
+            self.highlightedSelection = selection
+            self.highlights = {}
+            if self.events.squareSelected != ():
+                self.highlights[self.events.squareSelected] = 'selected'
+            for possibleMove in self.board.legalMoves.get(self.events.squareSelected, []):
+                self.highlights[moveEncoding.endSquare(possibleMove)] = 'capture' if moveEncoding.capturedPiece(possibleMove) else 'legalMove'
+        return self.highlights
+
+    # the empty checkerboard, copied from behind a square whenever it's redrawn
+    def renderCheckerboard(self):
+        boardSurface = pygame.Surface((8*self.tileSize, 8*self.tileSize))
         for file in range(8):
             for rank in range(8):
                 tileColor = assets.color['lightTile'] if (file + rank) % 2 != 0 else assets.color['darkTile']
-                squareIndex = util.relativeCoordinatesToSquareIndex((file,rank))
-                if (squareIndex == self.events.squareSelected):
-                    tileColor = assets.color['selected']
-                pygame.draw.rect(self.window, tileColor, (file*self.tileSize, rank*self.tileSize, self.tileSize, self.tileSize))
-                if (self.board.legalMoves is not None and self.events.squareSelected in self.board.legalMoves):
-                    if (squareIndex in [possibleMove.endSquare for possibleMove in self.board.legalMoves[self.events.squareSelected]]):
-                        if (self.board.isOpponent(squareIndex, self.events.squareSelected) or self.board.isPawnCapture(self.events.squareSelected, squareIndex)):
-                            pygame.draw.rect(self.window, assets.color['capture'], (file*self.tileSize, rank*self.tileSize, self.tileSize, self.tileSize))
-                        else:
-                            pygame.draw.circle(self.window, assets.color['legalMove'], (file*self.tileSize + self.tileSize//2, rank*self.tileSize + self.tileSize//2), self.tileSize//8)
-            
-        for index, pieceType in enumerate(self.board.pieceLists):
-            for activePiecePosition in pieceType:
-                self.window.blit(self.loadedAssets[index], tuple(x * self.tileSize for x in util.squareIndexToRelativeCoordinate(activePiecePosition)))
-
-        pygame.display.flip()
+                pygame.draw.rect(boardSurface, tileColor, (file*self.tileSize, rank*self.tileSize, self.tileSize, self.tileSize))
+        return boardSurface
+
+    # forgets what is on the display, the next frame draws every square (after resizing or another screen)
+    def invalidateBoard(self):
+        self.drawnSquares = None
+        self.highlightedSelection = None
+        self.needsRedraw = True
 
+    # while the AI thinks the wait times out now and then to pick up its move. a resize is only
+    # applied once the window has stopped changing size, or before any other event needs the new size
     def handleInput(self):
-        event = pygame.event.wait()
+        if self.pendingResize is not None:
+            event = pygame.event.wait(resizeSettleTime)
+        else:
+            event = pygame.event.wait(aiPollInterval if self.aiSearch.isThinking() else 0)
+        if self.pendingResize is not None and event.type != pygame.VIDEORESIZE:
+            self.resizeWindow(*self.pendingResize)
+            self.pendingResize = None
+        if event.type == pygame.NOEVENT:
+            self.playAIMoveIfReady()
+            return
+        self.needsRedraw = True
 
         if event.type == pygame.QUIT:
+            self.aiSearch.cancel()
             self.running = False
         elif event.type == pygame.MOUSEBUTTONDOWN:  # any mouse buttons lol
             self.updateMouseEvent()
         elif event.type == pygame.KEYDOWN:
             if event.key == pygame.K_z:
+                aiWasThinking = self.aiSearch.isThinking()
+                self.aiSearch.cancel()
                 self.board.unmakeMove()
-                if self.board.AIMode: 
+                if self.board.AIMode and not aiWasThinking:
                     self.board.unmakeMove()
             elif event.key == pygame.K_r:   # reset to starting fen
                 self.resetBoard()
@@ -72,46 +141,75 @@ class game:
             elif event.key == pygame.K_t:
                 self.board.AIMode = not self.board.AIMode
                 if self.board.AIMode:
-                    self.board.makeAIMove()
+                    self.aiSearch.start(self.board)
+                else:
+                    self.aiSearch.cancel()
         elif event.type == pygame.VIDEORESIZE:
-            self.resizeWindow(event.size, event.w, event.h)
+            self.pendingResize = (event.size, event.w, event.h)
+            self.needsRedraw = False
+        elif event.type == pygame.VIDEOEXPOSE:
+            self.invalidateBoard()
 
     def updateMouseEvent(self):
+        if self.aiSearch.isThinking():  # not the player's move yet
+            return
         if (self.events.addClick(pygame.mouse.get_pos(), self.tileSize)):   # there was a click that wasn't deselecting (either first or second)
             if (len(self.events.mouseClicks) == 2): # trying to make move
                 startSquare = self.events.mouseClicks[0]
                 endSquare = self.events.mouseClicks[1]
                 
-                chosenMove = next((possibleMove for possibleMove in self.board.legalMoves[startSquare] if possibleMove.endSquare == endSquare), None)
+                candidateMoves = [possibleMove for possibleMove in self.board.legalMoves[startSquare] if moveEncoding.endSquare(possibleMove) == endSquare]
+                chosenMove = self.choosePromotion(candidateMoves) if len(candidateMoves) > 1 else next(iter(candidateMoves), None)
                 if chosenMove is not None: 
-                    soundEffect = self.sounds['capture'] if chosenMove.capturedPiece else self.sounds['pieceMove']
+                    soundEffect = self.sounds['capture'] if moveEncoding.capturedPiece(chosenMove) else self.sounds['pieceMove']
                     soundEffect.play()
 
-                    self.processCheckmate(self.board.makeMove(chosenMove))  # valid move chosen, make it
-                    if self.board.AIMode: 
-                        self.processCheckmate(self.board.makeAIMove())
+                    self.board.makeMove(chosenMove)  # valid move chosen, make it
+                    if not self.processCheckmate(self.board.isCheckmate()) and self.board.AIMode:
+                        self.aiSearch.playerMoved(self.board, chosenMove)
 
             elif (self.board.verifySelection(self.events.squareSelected)):  # first click, make sure can choose that square
                 return  # avoid clearing input if valid first click made
         
         self.events.resetMouseInput()   # clear user inputs (after move made or invalid piece chosen)
     
+    # a pawn reaching the last rank has one move per promotion piece
+    def choosePromotion(self, candidateMoves):
+        chosenPiece = promotionScreen.choosePromotionForPawn()
+        self.invalidateBoard()
+        return next(possibleMove for possibleMove in candidateMoves if piece.pieceMap[moveEncoding.promotionPieceType(possibleMove)] == chosenPiece)
+
     def resizeWindow(self, size, width, height):
         self.window.fill(assets.color['black'])
         self.tileSize = min(width, height) // 8
         self.loadedAssets = self.loadAssets()
+        self.boardSurface = self.renderCheckerboard()
+        self.invalidateBoard()
 
     def loadAssets(self):
-        images = []
-        for i in range(12):
-            images.append(pygame.transform.scale(assets.pieceNumberToImage[i], (self.tileSize, self.tileSize)))
-        return images
+        return assets.getScaledPieceImages(self.tileSize)
     
+    # makes the AI's move once its background search is done, then ponders the player's expected reply
+    def playAIMoveIfReady(self):
+        result = self.aiSearch.result(self.board)
+        if result is None:
+            return
+        self.board.lastSearchResult = result
+        print(result)
+        if result.bestMove != moveEncoding.noMove:
+            self.board.makeMove(result.bestMove)
+        self.needsRedraw = True
+        if not self.processCheckmate(self.board.isCheckmate()) and len(result.principalVariation) > 1:
+            self.aiSearch.startPondering(self.board, result.principalVariation[1])
+
     def processCheckmate(self, checkmate):
         if checkmate:
             self.board.AIMode = titleScreen.waitGameStart(f"{"You" if not self.board.whiteToMove else "AI"} win{"" if not self.board.whiteToMove else "s"}!")
             self.resetBoard()
+        return checkmate
     
     def resetBoard(self):
+        self.aiSearch.cancel()
+        self.invalidateBoard()
         self.board = gameBoard.board(self.board.AIMode)
         self.events = events.events()
\ No newline at end of file
@@ -1,23 +1,24 @@
-from dataclasses import dataclass
-from random import choice
-
+import bitboards
+import evaluation
+import moveEncoding
 import numpy as np
+import openingBook
+import parallelSearch
 import piece
-import promotionScreen
+import search
+import tablebase
+import transpositionTable
 import util
+import zobrist
+from array import array
 
-@dataclass
-class move:
-    startSquare: int
-    endSquare: int
-    capturedPiece: piece
-    capturedPieceSquare: int
-    isCastle: bool
+noSquare = -1
+maxGamePly = 2048
 
 class board:
     # useful FENs
     startingFen = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
-    pawnPromotionFen = '8/P7/8/8/8/8/8/8 w - - 0 1'
+    pawnPromotionFen = '4k3/P7/8/8/8/8/8/4K3 w - - 0 1'
     allCastlingPossibleFen = 'r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1'
     piecePinnedFen = 'r3k2r/1pp2ppp/p1n1n3/3q2B1/3P4/2N5/PPP1QPPP/R3K2R w KQkq - 0 1'
     checkmateFen = '6k1/5ppp/8/8/8/5Q2/5PPP/6K1 w - - 0 1'
@@ -25,67 +26,121 @@ class board:
     # FENs with known bugs
     bugInKingMoves = 'rnb2b1r/pp2kpp1/2p1p2p/5n2/4N3/P7/1PP2PPP/R4KNR b KQkq - 0 1' # check king with knight to his right
     
-    def __init__(self, AIMode):
+    def __init__(self, AIMode, fen=startingFen):
         self.AIMode = AIMode
+        self.aiSearchLimits = {'maxTime': 1.0}  # any of maxDepth, maxNodes, maxTime (seconds)
+        self.aiWorkers = 1  # processes searching each AI move, more than one shares the transposition table between them
+        self.lastSearchResult = None
+        self.openingBook = openingBook.openBook()   # consulted before searching, None without a book file
+        self.tablebases = tablebase.openTablebases()    # probed by the search, None without generated tables
+        self.transpositionTable = transpositionTable.TranspositionTable()  # kept between searches, None searches without one
         self.board = np.zeros(64, dtype=np.uint8)
-        self.bitboards = np.zeros(6, dtype=np.uint64)
+        self.bitboards = np.zeros(bitboards.nBitboards, dtype=np.uint64)
         self.pieceLists = [list() for _ in range(12)]
         self.castlingRights = CastlingRights()
         self.whiteToMove = True
-        self.checkedSquares = []
-        self.moveLog = []
-        self.legalMoves = {}
-        self.piecesLegalMoves = []
-        self.squaresEnemyAttacks = []
-        self.initBoard()
-
-    def initBoard(self):
-        self.positionFromFen(self.startingFen)
+        self.checkers = 0
+        self.checkMask = bitboards.fullBoard
+        self.pinRays = {}
+        # which kinds of moves are being generated, captures include promotions and en passant
+        self.generatingCaptures = True
+        self.generatingQuiets = True
+        self.targetMask = bitboards.fullBoard
+        self.enPassantSquare = noSquare
+        self.halfmoveClock = 0
+        self.fullmoveNumber = 1
+        self.legalMovesCache = None
+        # fixed-size undo stack, one slot per ply for the move and the state it can't be recovered from
+        self.plyCount = 0
+        self.undoMoves = array('I', [moveEncoding.noMove]) * maxGamePly
+        self.undoCastlingRights = array('B', [0]) * maxGamePly
+        self.undoEnPassantSquares = array('b', [noSquare]) * maxGamePly
+        self.undoHalfmoveClocks = array('H', [0]) * maxGamePly
+        # zobrist key of the position before each ply, doubles as the key's undo slot
+        self.hashHistory = array('Q', [0]) * maxGamePly
+        self.hashKey = 0
+        self.positionCounts = {}    # hash key -> times reached along the game so far
+        # running evaluation totals, white minus black material and piece-square scores
+        self.middlegameScore = 0
+        self.endgameScore = 0
+        self.gamePhase = 0
+        self.moveBuffers = moveEncoding.createMoveBuffers()
+        self.moveBuffer = self.moveBuffers[0]
+        self.nMoves = 0
+        self.initBoard(fen)
+
+    def initBoard(self, fen=startingFen):
+        self.initialFen = fen   # with the move log, lets another process rebuild this game
+        self.board[:] = piece.none
+        self.bitboards[:] = 0
+        self.pieceLists = [list() for _ in range(12)]
+        self.plyCount = 0
+        self.legalMovesCache = None
+        self.positionFromFen(fen)
         self.setupPieceInformation()
-        self.getAllLegalMoves()
-        self.updateAttackedSquares()
+        if self.isSquareAttacked(self.kingSquare(not self.whiteToMove), self.whiteToMove):
+            raise ValueError(f"the side not to move is in check in FEN: {fen!r}")
+        self.hashKey = zobrist.computeHash(self)
+        self.positionCounts = {self.hashKey: 1}
+        self.middlegameScore, self.endgameScore, self.gamePhase = evaluation.scratchTotals(self)
     
+    # bitboards are built up as python ints and written to the numpy array once
     def setupPieceInformation(self):
-        for squareIndex in range(64): 
-            currentPiece = self.board[squareIndex]
-
+        pieceBitboards = [0] * len(self.bitboards)
+        for squareIndex, currentPiece in enumerate(self.board.tolist()):
             if (currentPiece != piece.none):
-                pieceType = piece.pieceToPieceType(currentPiece)
                 pieceListIndex = board.pieceToListIndex(currentPiece)
                 mask = 1 << squareIndex
-                self.bitboards[pieceType-1] |= np.uint64(mask)
+                pieceBitboards[pieceListIndex] |= mask
+                pieceBitboards[board.pieceToColorIndex(currentPiece)] |= mask
+                pieceBitboards[bitboards.allPieces] |= mask
                 self.pieceLists[pieceListIndex].append(squareIndex)
+        self.bitboards[:] = pieceBitboards
 
-    def printPositionAsFen(self):
-        fenString = ""
-        nBlanks = 0
-        for file in range(8):
-            for rank in range(8):
-                currentPiece = self.board[file*8 + rank]
+    # the exact position, castling rights, en passant square and clocks included, so loading it again needs no move history
+    def positionAsFen(self):
+        return self.positionAsEpd(None) + f" {self.halfmoveClock} {self.fullmoveNumber}"
+
+    # the first four FEN fields followed by EPD operations, e.g. {'bm': 'e4', 'id': '"start"'}
+    def positionAsEpd(self, operations=None):
+        fenRanks = []
+        for rank in range(8):
+            fenRank = ""
+            nBlanks = 0
+            for file in range(8):
+                currentPiece = self.board[rank*8 + file]
                 symbol = util.getFenRepresentationOfPiece(piece.pieceToPieceType(currentPiece), piece.isWhite(currentPiece))
-                if symbol == '': 
+                if symbol == '':
                     nBlanks += 1
                 else:
-                    fenString += (str(nBlanks) if nBlanks > 0 else '') + symbol
+                    fenRank += (str(nBlanks) if nBlanks > 0 else '') + symbol
                     nBlanks = 0
-            fenString += (str(nBlanks) if nBlanks > 0 else '') + ('/' if file < 7 else '')
-            nBlanks = 0
-        fenString += ' w' if self.whiteToMove else ' b'
+            fenRanks.append(fenRank + (str(nBlanks) if nBlanks > 0 else ''))
+
+        fenEnPassant = util.squareIndexToSquareName(self.enPassantSquare) if self.enPassantSquare != noSquare else '-'
+        epdString = f"{'/'.join(fenRanks)} {'w' if self.whiteToMove else 'b'} {self.castlingRights.toFen()} {fenEnPassant}"
+        if operations:
+            epdString += ' ' + ' '.join(f"{opcode} {operand};" for opcode, operand in operations.items())
+        return epdString
 
-        fenString += ' KQkq'
-        fenString += ' - 0 1'
-        print(fenString)  
+    def printPositionAsFen(self):
+        print(self.positionAsFen())
 
     def isOpponent(self, squareIndex, squareSelected):
-        if (squareSelected is None or squareIndex is None or self.board[squareIndex] == piece.none or self.board[squareSelected] == piece.none):
+        if (squareSelected is None or squareIndex is None):
             return False
-        return piece.isWhite(self.board[squareIndex]) != piece.isWhite(self.board[squareSelected])
+        whitePieces = int(self.bitboards[bitboards.whitePieces])
+        blackPieces = int(self.bitboards[bitboards.blackPieces])
+        squareMask, selectedMask = bitboards.squareBit(squareIndex), bitboards.squareBit(squareSelected)
+        return bool((whitePieces & squareMask and blackPieces & selectedMask) or (blackPieces & squareMask and whitePieces & selectedMask))
 
     def isPawnCapture(self, squareIndex, squareSelected):
-        squareFile,squareRank = util.squareIndexToRelativeCoordinate(squareIndex)
-        selectedFile,selectedRank = util.squareIndexToRelativeCoordinate(squareSelected)
-        return (piece.pieceToPieceType(self.board[squareIndex]) == piece.pawn and squareFile != selectedFile)
+        pawns = self.pieceBitboard(piece.white | piece.pawn) | self.pieceBitboard(piece.black | piece.pawn)
+        return bool(pawns & bitboards.squareBit(squareIndex)) and squareIndex % 8 != squareSelected % 8
 
+    # reads all six FEN fields, the clocks may be left out (as in EPD, whose operations after the
+    # fourth field are ignored here). raises ValueError for anything that isn't a playable position,
+    # initBoard adds the one check that needs the bitboards (the side not to move can't be in check)
     def positionFromFen(self, position):
         pieceTypeFromSymbol = {
             'k' : piece.king,
@@ -96,34 +151,119 @@ class board:
             'q' : piece.queen
         }
 
-        fenSections = position.split(' ')
-        fenBoard = fenSections[0]
-        file = 0
-        rank = 0
+        fenSections = position.split()
+        if not fenSections or len(fenSections[0].split('/')) != 8:
+            raise ValueError(f"FEN needs 8 ranks: {position!r}")
 
-        for char in fenBoard:
-            if (char == '/'):
-                file = 0
-                rank += 1
-            else:
+        placement = [piece.none] * 64
+        for rank, fenRank in enumerate(fenSections[0].split('/')):
+            file = 0
+            for char in fenRank:
                 if (char.isdigit()):
                     file += int(char)
-                else:
+                elif char.lower() in pieceTypeFromSymbol and file < 8:
                     pieceColor = piece.white if char.isupper() else piece.black
                     pieceType = pieceTypeFromSymbol[char.lower()]
-                    self.board[rank*8 + file] = pieceColor | pieceType
+                    placement[rank*8 + file] = pieceColor | pieceType
                     file += 1
-        
-        self.whiteToMove = True if fenSections[1] == 'w' else False
+                else:
+                    raise ValueError(f"bad piece placement {fenRank!r} in FEN: {position!r}")
+            if file != 8:
+                raise ValueError(f"rank {fenRank!r} doesn't cover 8 files in FEN: {position!r}")
+        for kingPiece in (piece.white | piece.king, piece.black | piece.king):
+            if placement.count(kingPiece) != 1:
+                raise ValueError(f"FEN needs one king per side: {position!r}")
+        if any(placement[squareIndex] & 7 == piece.pawn for squareIndex in [*range(8), *range(56, 64)]):
+            raise ValueError(f"pawn on the first or last rank in FEN: {position!r}")
+        self.board[:] = placement
+
+        sideToMove = fenSections[1] if len(fenSections) > 1 else 'w'
+        if sideToMove not in ('w', 'b'):
+            raise ValueError(f"side to move has to be w or b in FEN: {position!r}")
+        self.whiteToMove = sideToMove == 'w'
+
+        fenCastling = fenSections[2] if len(fenSections) > 2 else '-'
+        if fenCastling != '-' and not set(fenCastling) <= set(CastlingRights.fenSymbols):
+            raise ValueError(f"bad castling rights {fenCastling!r} in FEN: {position!r}")
+        self.castlingRights = CastlingRights.fromFen(fenCastling)
+        # a right whose king or rook isn't at home can never be used, and the generator doesn't check for the rook
+        for squareIndex, pieceOnSquare in ((60, piece.white | piece.king), (63, piece.white | piece.rook), (56, piece.white | piece.rook),
+                                           (4, piece.black | piece.king), (7, piece.black | piece.rook), (0, piece.black | piece.rook)):
+            if self.board[squareIndex] != pieceOnSquare:
+                self.castlingRights.updateForMove(squareIndex, squareIndex)
+
+        fenEnPassant = fenSections[3] if len(fenSections) > 3 else '-'
+        if fenEnPassant == '-':
+            self.enPassantSquare = noSquare
+        elif len(fenEnPassant) == 2 and fenEnPassant[0] in 'abcdefgh' and fenEnPassant[1] == ('6' if self.whiteToMove else '3'):
+            self.enPassantSquare = util.squareNameToSquareIndex(fenEnPassant)
+            # the pawn that just moved two squares stands in front of the square, its start and the square are empty
+            pawnRankOffset = 8 if self.whiteToMove else -8
+            movedPawn = (piece.black if self.whiteToMove else piece.white) | piece.pawn
+            if (placement[self.enPassantSquare + pawnRankOffset] != movedPawn or placement[self.enPassantSquare] != piece.none
+                    or placement[self.enPassantSquare - pawnRankOffset] != piece.none):
+                raise ValueError(f"no pawn can just have moved past en passant square {fenEnPassant!r} in FEN: {position!r}")
+        else:
+            raise ValueError(f"bad en passant square {fenEnPassant!r} in FEN: {position!r}")
+
+        clocks = [int(section) for section in fenSections[4:6] if section.isdigit()]
+        self.halfmoveClock = clocks[0] if len(clocks) > 0 else 0
+        self.fullmoveNumber = max(clocks[1], 1) if len(clocks) > 1 else 1
+
+    # only generated when something asks for them, so make/unmake inside a search never pays for it
+    @property
+    def legalMoves(self):
+        if self.legalMovesCache is None:
+            self.getAllLegalMoves()
+        return self.legalMovesCache
+
+    @property
+    def moveLog(self):
+        return self.undoMoves[:self.plyCount].tolist()
 
+    # legalMoves maps each of the side to move's pieces to its list of encoded moves
     def getAllLegalMoves(self):
-        self.legalMoves = {}
+        self.legalMovesCache = {}
+        self.moveBuffer = self.moveBuffers[0]
+        self.nMoves = 0
+        self.setGeneratedMoveKinds(True, True)
+        self.updateCheckAndPinMasks()
         def getPiecesLegalMoves(pieceSquare):
+            firstMoveIndex = self.nMoves
             self.populateLegalMoves(pieceSquare)
-            self.legalMoves[pieceSquare] = self.piecesLegalMoves
+            self.legalMovesCache[pieceSquare] = self.moveBuffer[firstMoveIndex:self.nMoves].tolist()
 
         self.iteratePieces(getPiecesLegalMoves)
 
+    # fills the preallocated buffer for this ply and returns how many moves were written to it.
+    # captures=False or quiets=False leave that kind out, so a search can generate in stages
+    def generateLegalMoves(self, ply, captures=True, quiets=True):
+        self.moveBuffer = self.moveBuffers[ply]
+        self.nMoves = 0
+        self.setGeneratedMoveKinds(captures, quiets)
+        self.updateCheckAndPinMasks()
+        self.iteratePieces(self.populateLegalMoves)
+        return self.nMoves
+
+    def setGeneratedMoveKinds(self, captures, quiets):
+        self.generatingCaptures = captures
+        self.generatingQuiets = quiets
+        self.targetMask = ((self.colorOccupancy(not self.whiteToMove) if captures else 0) |
+                           (~self.occupancy() & bitboards.fullBoard if quiets else 0))
+
+    # checks a move from somewhere other than the generator (the transposition table, a killer slot)
+    # by generating only the moves of the piece on its start square
+    def isLegalMove(self, ply, encodedMove):
+        startSquare = moveEncoding.startSquare(encodedMove)
+        if encodedMove == moveEncoding.noMove or not self.verifySelection(startSquare):
+            return False
+        self.moveBuffer = self.moveBuffers[ply]
+        self.nMoves = 0
+        self.setGeneratedMoveKinds(True, True)
+        self.updateCheckAndPinMasks()
+        self.populateLegalMoves(startSquare)
+        return encodedMove in self.moveBuffer[:self.nMoves]
+
     def iteratePieces(self, function):
         pieceListOffset = 0 if self.whiteToMove else 6
         for i in range(6):
@@ -135,398 +275,301 @@ class board:
                     for pieceSquare in pieceList:
                         function(pieceSquare)
 
-    def pieceIsPinned(self, squareIndex):
-        kingPosition = np.argmax(self.board == (not self.whiteToMove) * 8 + 9)
-        kingFile, kingRank = util.squareIndexToRelativeCoordinate(kingPosition)
-        currentFile, currentRank = util.squareIndexToRelativeCoordinate(squareIndex)
-
-        df, dr = kingFile-currentFile, kingRank-currentRank
-        if (df == 0 and dr == 0) or (abs(df) != abs(dr) and not (df == 0 or dr == 0)): return False
-
-        def clampValue(val):
-            if val > 0: return 1
-            elif val == 0: return 0
-            else: return -1
-        
-        df = clampValue(df)
-        dr = clampValue(dr)
-
-        while True:
-            currentFile += df
-            currentRank += dr
-
-            if currentFile == kingFile and currentRank == kingRank: 
-                break
-            if self.board[util.relativeCoordinatesToSquareIndex((currentFile, currentRank))] != piece.none: 
-                return False
-        
-        currentFile, currentRank = util.squareIndexToRelativeCoordinate(squareIndex)
-        df, dr = -df, -dr
-        currentFile += df
-        currentRank += dr
-        
-        while util.fileRankInbounds(currentFile, currentRank):
-            pieceInPath = self.board[util.relativeCoordinatesToSquareIndex((currentFile, currentRank))]
-            if pieceInPath:
-                return (-df, -dr) if self.checkIfPieceCanPin(pieceInPath, -df, -dr) else False
-            
-            currentFile += df
-            currentRank += dr
-
-        return False
-    
-    def checkIfPieceCanPin(self, pieceInPath, df, dr):
-        if piece.isWhite(pieceInPath) == self.whiteToMove: return False     # can't pin yourself
-        
-        pieceInPathType = piece.pieceToPieceType(pieceInPath)
-        if pieceInPathType == piece.queen: return True
-        if pieceInPathType in [piece.pawn, piece.king]: return False  # these pieces can't pin, note knight's have already been returned false
-
-        if (abs(df) ^ abs(dr)): return pieceInPathType == piece.rook
-        if (abs(df) and abs(dr)): return pieceInPathType == piece.bishop
+    # computed once per position: the pieces giving check, the squares that resolve a single check
+    # and, for every pinned piece, the ray (including the pinning piece) it is allowed to move along
+    def updateCheckAndPinMasks(self):
+        kingSquare = self.kingSquare(self.whiteToMove)
+        enemyIsWhite = not self.whiteToMove
+        occupancy = self.occupancy()
+        friendlyPieces = self.colorOccupancy(self.whiteToMove)
+        enemyPieces = self.colorOccupancy(enemyIsWhite)
+
+        self.checkers = self.attackersOfSquare(kingSquare, enemyIsWhite, occupancy)
+        nCheckers = bitboards.popCount(self.checkers)
+        if nCheckers == 0:
+            self.checkMask = bitboards.fullBoard
+        elif nCheckers == 1:
+            checkerSquare = self.checkers.bit_length() - 1
+            self.checkMask = self.checkers | bitboards.betweenTable[kingSquare][checkerSquare]
+        else:
+            self.checkMask = 0  # double check, only the king can move
+
+        self.pinRays = {}
+        enemyOffset = 0 if enemyIsWhite else 6
+        enemyQueens = self.bitboards[enemyOffset + piece.queen-1]
+        # sliders that would attack the king if only enemy pieces blocked their path
+        snipers = ((bitboards.rookAttacks(kingSquare, enemyPieces) & int(self.bitboards[enemyOffset + piece.rook-1] | enemyQueens)) |
+                   (bitboards.bishopAttacks(kingSquare, enemyPieces) & int(self.bitboards[enemyOffset + piece.bishop-1] | enemyQueens)))
+        for sniperSquare in bitboards.iterateBits(snipers):
+            between = bitboards.betweenTable[kingSquare][sniperSquare]
+            blockers = between & occupancy
+            if blockers & friendlyPieces and bitboards.popCount(blockers) == 1:
+                self.pinRays[blockers.bit_length() - 1] = between | bitboards.squareBit(sniperSquare)
 
     def populateLegalMoves(self, squareIndex):
-        self.piecesLegalMoves = []
-
         currentPiece = self.board[squareIndex]
         pieceType = piece.pieceToPieceType(currentPiece)
 
-        if pieceType == piece.pawn:
-            self.generatePawnMoves(squareIndex)
-        elif pieceType == piece.knight:
-            self.generateKnightMoves(squareIndex)
-        elif pieceType == piece.king:
+        if pieceType == piece.king:
             self.generateKingMoves(squareIndex)
+            return
+        if self.checkMask == 0:
+            return
+
+        moveMask = self.checkMask & self.pinRays.get(squareIndex, bitboards.fullBoard)
+        if pieceType == piece.pawn:
+            self.generatePawnMoves(squareIndex, moveMask)
+            return
+        moveMask &= self.targetMask
+        if pieceType == piece.knight:
+            self.generateKnightMoves(squareIndex, moveMask)
 
         if pieceType == piece.bishop or pieceType == piece.queen:
-            self.addDiagonalSliding(squareIndex)
+            self.addDiagonalSliding(squareIndex, moveMask)
         if pieceType == piece.queen or pieceType == piece.rook:
-            self.addSliding(squareIndex)
-
-        if pinInformation := self.pieceIsPinned(squareIndex):
-            self.filterPins(pinInformation)
-
-    # pinInformation = (df, dr) for line from pinnedPiece to pinningPiece where -1 <= df,dr <= 1 and df,dr are integers
-    def filterPins(self, pinInformation):
-        def inlineMove(moveData):
-            startFile, startRank = util.squareIndexToRelativeCoordinate(moveData.startSquare)
-            endFile, endRank = util.squareIndexToRelativeCoordinate(moveData.endSquare)
-            df = endFile - startFile
-            dr = endRank - startRank
-            df = cap(df)
-            dr = cap(dr)
-
-            return abs(df) == abs(pinInformation[0]) and abs(dr) == abs(pinInformation[1])
-        
-        def cap(x):
-            if x == 0:
-                return 0
-            elif x < 0:
-                return -1
-            return 1
-        
-        self.piecesLegalMoves = [m for m in self.piecesLegalMoves if inlineMove(m)]
+            self.addSliding(squareIndex, moveMask)
 
-    def generatePawnMoves(self, squareIndex):
-        movementDirection = -8 if piece.isWhite(self.board[squareIndex]) else 8
+    def generatePawnMoves(self, squareIndex, moveMask):
+        pawnIsWhite = piece.isWhite(self.board[squareIndex])
+        movementDirection = -8 if pawnIsWhite else 8
         file,rank = util.squareIndexToRelativeCoordinate(squareIndex)
+        occupancy = self.occupancy()
         
-        if (self.board[squareIndex+movementDirection] == piece.none):
-            self.addMoveData(squareIndex, squareIndex+movementDirection, piece.none, None)
+        if not (occupancy & bitboards.squareBit(squareIndex+movementDirection)):
+            # pushing onto the last rank is generated with the captures
+            isPromotion = rank == (1 if pawnIsWhite else 6)
+            if moveMask & bitboards.squareBit(squareIndex+movementDirection) and (self.generatingCaptures if isPromotion else self.generatingQuiets):
+                self.addPawnMoveData(squareIndex, squareIndex+movementDirection, piece.none)
 
-            if ((rank == 1 and movementDirection == 8) or (rank == 6 and movementDirection == -8)):
+            if ((rank == 1 and movementDirection == 8) or (rank == 6 and movementDirection == -8)) and self.generatingQuiets:
                 newSquareIndex = squareIndex+(2*movementDirection)
-                if (self.board[newSquareIndex] == piece.none):
-                    self.addMoveData(squareIndex, newSquareIndex, piece.none, None)
-        
+                if not (occupancy & bitboards.squareBit(newSquareIndex)) and moveMask & bitboards.squareBit(newSquareIndex):
+                    self.addMoveData(squareIndex, newSquareIndex, piece.none, moveEncoding.doublePawnPushFlag)
+
+        if not self.generatingCaptures:
+            return
         # captures
-        newRank = rank + (1 if movementDirection == 8 else -1)
-        def addCaptureData(newSquareIndex):
-            if (self.isOpponent(squareIndex, newSquareIndex)):
-                self.addMoveData(squareIndex, newSquareIndex, self.board[newSquareIndex], newSquareIndex)
-        
-        if (file > 0):
-            addCaptureData(util.relativeCoordinatesToSquareIndex((file-1, newRank)))
-        if (file < 7):
-            addCaptureData(util.relativeCoordinatesToSquareIndex((file+1, newRank)))
+        pawnAttacks = bitboards.whitePawnAttackTable[squareIndex] if pawnIsWhite else bitboards.blackPawnAttackTable[squareIndex]
+        for newSquareIndex in bitboards.iterateBits(pawnAttacks & self.colorOccupancy(not pawnIsWhite) & moveMask):
+            self.addPawnMoveData(squareIndex, newSquareIndex, self.board[newSquareIndex])
 
         # en passant 
-        def checkEnpassant(subtracting, shouldBeWhite):
-            enemySquare = squareIndex + (-1 if subtracting else 1)
-            if self.board[enemySquare] == (piece.pawn | (piece.white if shouldBeWhite else piece.black)) and (file > 0 if subtracting else file < 7) and self.moveLog and self.moveLog[-1].endSquare == enemySquare:
-                self.addMoveData(squareIndex, enemySquare + movementDirection, self.board[enemySquare], enemySquare)
-                return True
-            return False
-
-        if (rank == 3 and movementDirection == -8):
-            if not checkEnpassant(False, False):
-                checkEnpassant(True, False)
-        elif (rank == 4 and movementDirection == 8):
-            if not checkEnpassant(False, True):
-                checkEnpassant(True, True)
+        if self.enPassantSquare != noSquare and pawnAttacks & bitboards.squareBit(self.enPassantSquare):
+            enemySquare = self.enPassantSquare - movementDirection
+            if self.enPassantIsLegal(squareIndex, self.enPassantSquare, enemySquare):
+                self.addMoveData(squareIndex, self.enPassantSquare, self.board[enemySquare], moveEncoding.enPassantFlag)
+
+    # reaching the last rank adds one move per promotion piece
+    def addPawnMoveData(self, squareIndex, newSquareIndex, capturedPiece):
+        if newSquareIndex < 8 or newSquareIndex >= 56:
+            for promotionPieceType in moveEncoding.promotionPieceTypes:
+                self.addMoveData(squareIndex, newSquareIndex, capturedPiece, promotionPieceType=promotionPieceType)
+        else:
+            self.addMoveData(squareIndex, newSquareIndex, capturedPiece)
 
-    def generateKnightMoves(self, squareIndex):
-        file,rank = util.squareIndexToRelativeCoordinate(squareIndex)
+    # en passant removes two pieces from the same rank, so the check and pin masks aren't enough.
+    # play it out on the occupancy and look for attacks on the king instead
+    def enPassantIsLegal(self, squareIndex, enPassantSquare, enemySquare):
+        enemySquareMask = bitboards.squareBit(enemySquare)
+        if not (self.checkMask & (bitboards.squareBit(enPassantSquare) | enemySquareMask)):
+            return False
+        occupancy = (self.occupancy() & ~bitboards.squareBit(squareIndex) & ~enemySquareMask) | bitboards.squareBit(enPassantSquare)
+        attackers = self.attackersOfSquare(self.kingSquare(self.whiteToMove), not self.whiteToMove, occupancy)
+        return (attackers & ~enemySquareMask) == 0
 
-        for knightMove in piece.knightMovementDirections:
-            newFile,newRank = file+knightMove[0],rank+knightMove[1]
-            if (util.fileRankInbounds(newFile,newRank)): 
-                newSquareIndex = util.relativeCoordinatesToSquareIndex((newFile,newRank))
-                self.addMoveData(squareIndex, newSquareIndex, self.board[newSquareIndex], newSquareIndex)
+    def generateKnightMoves(self, squareIndex, moveMask):
+        self.addMovesFromAttackSet(squareIndex, bitboards.knightAttackTable[squareIndex] & moveMask)
     
     def generateKingMoves(self, squareIndex):
         file,rank = util.squareIndexToRelativeCoordinate(squareIndex)
-        for df in [-1,0,1]:
-            for dr in [-1,0,1]:
-                if (df == dr == 0): continue
-                
-                newFile = file+df
-                newRank = rank+dr
-                if (not util.fileRankInbounds(newFile, newRank)):
-                    continue
-                newSquareIndex = util.relativeCoordinatesToSquareIndex((newFile, newRank))
-                # can't put yourself in check
-                if not newSquareIndex in self.squaresEnemyAttacks: 
-                    self.addMoveData(squareIndex, newSquareIndex, self.board[newSquareIndex], newSquareIndex)
-
-        kingColor = 'white' if self.whiteToMove else 'black'
+        enemyIsWhite = not self.whiteToMove
+        # the king doesn't block attacks on the squares behind it
+        occupancyWithoutKing = self.occupancy() & ~bitboards.squareBit(squareIndex)
+        for newSquareIndex in bitboards.iterateBits(bitboards.kingAttackTable[squareIndex] & self.targetMask):
+            # can't put yourself in check
+            if not self.isSquareAttacked(newSquareIndex, enemyIsWhite, occupancyWithoutKing): 
+                self.addMoveData(squareIndex, newSquareIndex, self.board[newSquareIndex])
+
+        # can't castle out of check
+        if self.checkers or not self.generatingQuiets:
+            return
+
+        occupancy = self.occupancy()
         # have castling rights
-        if self.castlingRights.possibleCastles[kingColor + 'QueenSide']: 
+        if self.castlingRights.canCastle(CastlingRights.whiteQueenSide if self.whiteToMove else CastlingRights.blackQueenSide): 
             # castling path not attacked by enemy pieces
-            if util.fileRankInbounds(file-3, rank) and ((squareIndex - 1) not in self.squaresEnemyAttacks) and ((squareIndex - 2) not in self.squaresEnemyAttacks): 
+            if util.fileRankInbounds(file-3, rank) and not self.isSquareAttacked(squareIndex - 1, enemyIsWhite) and not self.isSquareAttacked(squareIndex - 2, enemyIsWhite): 
                 # castling path doesn't have pieces in the way
-                if (self.board[squareIndex-1] == piece.none and self.board[squareIndex-2] == piece.none and self.board[squareIndex-3] == piece.none):
-                    self.addMoveData(squareIndex, squareIndex-2, piece.none, squareIndex-2, True)
-        if self.castlingRights.possibleCastles[kingColor + 'KingSide']: 
-            if util.fileRankInbounds(file+2, rank) and ((squareIndex + 1) not in self.squaresEnemyAttacks) and ((squareIndex + 2) not in self.squaresEnemyAttacks):
-                if (self.board[squareIndex+1] == piece.none and self.board[squareIndex+2] == piece.none):
-                    self.addMoveData(squareIndex, squareIndex+2, piece.none, squareIndex+2, True)
+                if not (occupancy & (bitboards.squareBit(squareIndex-1) | bitboards.squareBit(squareIndex-2) | bitboards.squareBit(squareIndex-3))):
+                    self.addMoveData(squareIndex, squareIndex-2, piece.none, moveEncoding.castleFlag)
+        if self.castlingRights.canCastle(CastlingRights.whiteKingSide if self.whiteToMove else CastlingRights.blackKingSide): 
+            if util.fileRankInbounds(file+2, rank) and not self.isSquareAttacked(squareIndex + 1, enemyIsWhite) and not self.isSquareAttacked(squareIndex + 2, enemyIsWhite):
+                if not (occupancy & (bitboards.squareBit(squareIndex+1) | bitboards.squareBit(squareIndex+2))):
+                    self.addMoveData(squareIndex, squareIndex+2, piece.none, moveEncoding.castleFlag)
     
-    def addDiagonalSliding(self, squareIndex):
-        file,rank = util.squareIndexToRelativeCoordinate(squareIndex)
-        for df in [-1,1]:
-            for dr in [-1,1]:
-                currentFile,currentRank = file,rank
-                while (True):
-                    currentFile += df
-                    currentRank += dr
-                    if (not util.fileRankInbounds(currentFile, currentRank)):
-                        break
-                    currentSquare = util.relativeCoordinatesToSquareIndex((currentFile, currentRank))
-                    pieceInPath = self.board[currentSquare]
-                    self.addMoveData(squareIndex, currentSquare, pieceInPath, currentSquare)
-                    if pieceInPath:
-                        break
+    def addDiagonalSliding(self, squareIndex, moveMask):
+        self.addMovesFromAttackSet(squareIndex, bitboards.bishopAttacks(squareIndex, self.occupancy()) & moveMask)
     
-    def addSliding(self, squareIndex):
-        file,rank = util.squareIndexToRelativeCoordinate(squareIndex)
-        for movementDirection in [-1,1]:
-            currentFile = file
-            while (True):
-                currentFile += movementDirection
-                if (not util.fileRankInbounds(currentFile, rank)):
-                    break
-                currentSquare = util.relativeCoordinatesToSquareIndex((currentFile, rank))
-                pieceInPath = self.board[currentSquare]
-                self.addMoveData(squareIndex, currentSquare, pieceInPath, currentSquare)
-                if pieceInPath:
-                    break
+    def addSliding(self, squareIndex, moveMask):
+        self.addMovesFromAttackSet(squareIndex, bitboards.rookAttacks(squareIndex, self.occupancy()) & moveMask)
+
+    def addMovesFromAttackSet(self, squareIndex, attackSet):
+        for currentSquare in bitboards.iterateBits(attackSet & ~self.colorOccupancy(self.whiteToMove)):
+            self.addMoveData(squareIndex, currentSquare, self.board[currentSquare])
+
+    def occupancy(self):
+        return int(self.bitboards[bitboards.allPieces])
+
+    def colorOccupancy(self, isWhite):
+        return int(self.bitboards[bitboards.whitePieces if isWhite else bitboards.blackPieces])
+
+    def pieceBitboard(self, currentPiece):
+        return int(self.bitboards[board.pieceToListIndex(currentPiece)])
+
+    def attackersOfSquare(self, squareIndex, byWhite, occupancy=None):
+        if occupancy is None:
+            occupancy = self.occupancy()
+        pieceBitboards = self.bitboards.tolist()
+        offset = 0 if byWhite else 6
+        # a pawn attacks this square if a pawn of the other color standing here would attack the pawn
+        pawnAttacks = bitboards.blackPawnAttackTable if byWhite else bitboards.whitePawnAttackTable
+        diagonalSliders = pieceBitboards[offset + piece.bishop-1] | pieceBitboards[offset + piece.queen-1]
+        straightSliders = pieceBitboards[offset + piece.rook-1] | pieceBitboards[offset + piece.queen-1]
+
+        return ((pawnAttacks[squareIndex] & pieceBitboards[offset + piece.pawn-1]) |
+                (bitboards.knightAttackTable[squareIndex] & pieceBitboards[offset + piece.knight-1]) |
+                (bitboards.kingAttackTable[squareIndex] & pieceBitboards[offset + piece.king-1]) |
+                (bitboards.bishopAttacks(squareIndex, occupancy) & diagonalSliders) |
+                (bitboards.rookAttacks(squareIndex, occupancy) & straightSliders))
+
+    def isSquareAttacked(self, squareIndex, byWhite, occupancy=None):
+        return self.attackersOfSquare(squareIndex, byWhite, occupancy) != 0
+
+    def kingSquare(self, isWhite):
+        return self.pieceBitboard((piece.white if isWhite else piece.black) | piece.king).bit_length() - 1
         
-        for movementDirection in [-1,1]:
-            currentRank = rank
-            while (True):
-                currentRank += movementDirection
-                if (not util.fileRankInbounds(file, currentRank)):
-                    break
-                currentSquare = util.relativeCoordinatesToSquareIndex((file, currentRank))
-                pieceInPath = self.board[currentSquare]
-                self.addMoveData(squareIndex, currentSquare, pieceInPath, currentSquare)
-                if pieceInPath:
-                    break
-        
-    # pieceToMove/endPosition = (file,rank)
-    # returns if checkmate
+    # only touches what the move changes, legal moves are regenerated lazily
     def makeMove(self, chosenMove):
-        self.castlingRights.saveCastleState()
-        self.moveLog.append(chosenMove)
-
-        self.updateBoardWithMove(chosenMove)
-        self.checkedSquares = self.checkForCheck()
-        self.updateMoveInformation()
-
-        if self.checkedSquares: 
-            self.filterSudoLegalMoves()
-            if len([m for sublist in self.legalMoves.values() for m in sublist]) == 0:
-                return True # checkmate
-        return False
-
-    def updateMoveInformation(self):
-        self.getAllLegalMoves()
-        self.updateAttackedSquares()
-        self.whiteToMove = not self.whiteToMove
-        self.getAllLegalMoves()
-
-    def filterSudoLegalMoves(self):
-        def validateMoves(pieceSquare):
-            self.legalMoves[pieceSquare] = [m for m in self.legalMoves[pieceSquare] if m.endSquare in self.checkedSquares]
-        self.iteratePieces(validateMoves)
-
-    def updateAttackedSquares(self):
-        def addPawnMoveToList(p):
-            movementDirection = -8 if self.whiteToMove else 8
-            rankDir = -1 if self.whiteToMove else 1
-            for dir in [-1,1]:
-                file,rank = util.squareIndexToRelativeCoordinate(p)
-                if not util.fileRankInbounds(file + dir, rank + rankDir):
-                    continue
-                
-                pieceInPath = self.board[p + movementDirection + dir]
-                if pieceInPath == piece.none or piece.isWhite(pieceInPath) != self.whiteToMove:
-                    self.squaresEnemyAttacks.append(p + movementDirection + dir)
-
-        self.squaresEnemyAttacks = [
-            item.endSquare
-            for sublist in self.legalMoves.values() 
-            for item in sublist
-            if piece.pieceToPieceType(self.board[item.startSquare]) != piece.pawn
-        ]
-
-        # check the current team's pawns moves to see what they could attack but aren't
-        pieceListIndex = board.pieceToListIndex((piece.white if self.whiteToMove else piece.black) | piece.pawn)
-        pieceList = self.pieceLists[pieceListIndex]
-        if isinstance(pieceList, int):
-            addPawnMoveToList(pieceList)
+        ply = self.plyCount
+        self.undoMoves[ply] = chosenMove
+        self.undoCastlingRights[ply] = self.castlingRights.rights
+        self.undoEnPassantSquares[ply] = self.enPassantSquare
+        self.undoHalfmoveClocks[ply] = self.halfmoveClock
+        self.hashHistory[ply] = self.hashKey
+        self.plyCount += 1
+
+        startSquare = moveEncoding.startSquare(chosenMove)
+        endSquare = moveEncoding.endSquare(chosenMove)
+        capturedPiece = moveEncoding.capturedPiece(chosenMove)
+        currentPiece = self.board[startSquare]
+        movedPieceType = piece.pieceToPieceType(currentPiece)
+        pieceColor = piece.white if self.whiteToMove else piece.black
+
+        if capturedPiece != piece.none:
+            self.setPieceInformationAtIndex(piece.none, moveEncoding.capturedPieceSquare(chosenMove))
+        if promotionPieceType := moveEncoding.promotionPieceType(chosenMove):
+            currentPiece = promotionPieceType | pieceColor
+        self.setPieceInformationAtIndex(piece.none, startSquare)
+        self.setPieceInformationAtIndex(currentPiece, endSquare)
+        if moveEncoding.isCastle(chosenMove):
+            rookStartSquare, rookEndSquare = board.castlingRookSquares(startSquare, endSquare)
+            self.setPieceInformationAtIndex(piece.none, rookStartSquare)
+            self.setPieceInformationAtIndex(piece.rook | pieceColor, rookEndSquare)
+
+        hashKey = self.hashKey ^ zobrist.castlingKeys[self.castlingRights.rights] ^ zobrist.enPassantKey(self.enPassantSquare)
+        self.castlingRights.updateForMove(startSquare, endSquare)
+        self.enPassantSquare = (startSquare + endSquare) // 2 if moveEncoding.isDoublePawnPush(chosenMove) else noSquare
+        self.hashKey = hashKey ^ zobrist.castlingKeys[self.castlingRights.rights] ^ zobrist.enPassantKey(self.enPassantSquare) ^ zobrist.blackToMoveKey
+        self.positionCounts[self.hashKey] = self.positionCounts.get(self.hashKey, 0) + 1
+        if capturedPiece != piece.none or movedPieceType == piece.pawn:
+            self.halfmoveClock = 0
         else:
-            for p in pieceList:
-                addPawnMoveToList(p)
-
-    def checkForCheck(self):
-        self.checkedSquares = []
-        kingSquare = self.findCurrentPlayersKingSquareIndex()
-        file,rank = util.squareIndexToRelativeCoordinate(kingSquare)
-
-        kingIsWhite = piece.isWhite(self.board[kingSquare])
-        oppositeColor = piece.black if kingIsWhite else piece.white
-        
-        movementDirection = -8 if kingIsWhite else 8
-        for dir in [-1,1]:
-            pawnSquare = kingSquare + movementDirection + dir
-            if self.board[pawnSquare] == (piece.pawn | oppositeColor):
-                return [pawnSquare]
-        
-        for knightMovementDirection in piece.knightMovementDirections:  # knights
-            knightFile,knightRank = file+knightMovementDirection[0],rank+knightMovementDirection[1]
-            if not util.fileRankInbounds(knightFile,knightRank): 
-                continue
-            knightSquare = util.relativeCoordinatesToSquareIndex((knightFile, knightRank))
-            if self.board[knightSquare] == (piece.knight | oppositeColor): 
-                return [knightSquare]
-
-        allPaths = []
-        closestPiecesSquare = []
-        attackType = []    
-        # queen, rook, bishop
-        for df in [-1,0,1]:
-            for dr in [-1,0,1]:
-                currentPath = []
-                if (df == dr == 0): 
-                    continue
-
-                currentFile, currentRank = file,rank
-                while True:
-                    currentFile += df
-                    currentRank += dr
-                    if (not util.fileRankInbounds(currentFile,currentRank)): 
-                        break
-
-                    currentSquare = util.relativeCoordinatesToSquareIndex((currentFile,currentRank))
-                    currentPath.append(currentSquare)
-                    pieceInPath = self.board[currentSquare]
-                    if pieceInPath:
-                        allPaths.append(currentPath)
-                        closestPiecesSquare.append(currentSquare)
-                        attackType.append(util.dFdRtoType(df, dr))
-                        break
-        
-        possiblePieceMatches = [piece.queen | oppositeColor, piece.rook | oppositeColor, piece.bishop | oppositeColor]
-        for index,blockingPieceSquare in enumerate(closestPiecesSquare):
-            blockingPiece = self.board[blockingPieceSquare]
-            if blockingPiece not in possiblePieceMatches: 
-                continue
-
-            blockingPieceType = piece.pieceToPieceType(blockingPiece)
-            attackDirection = attackType[index]
-            if ((blockingPieceType == piece.rook and (attackDirection == 'horizontal' or attackDirection == 'vertical')) or
-                (blockingPieceType == piece.bishop and attackDirection == 'diagonal') or
-                (blockingPieceType == piece.queen)):
-                return allPaths[index]
-
-        return []
+            self.halfmoveClock += 1
+        if not self.whiteToMove:
+            self.fullmoveNumber += 1
+        self.whiteToMove = not self.whiteToMove
+        self.legalMovesCache = None
 
     def unmakeMove(self):
-        if (len(self.moveLog) == 0): 
+        if self.plyCount == 0: 
             return
-        undoneMove = self.moveLog.pop()
-        self.castlingRights.undoCastleMove()
-        
-        self.updateBoardWithMove(move(undoneMove.endSquare, undoneMove.startSquare, piece.none, None, undoneMove.isCastle), True)
-        if undoneMove.capturedPiece:
-            self.setPieceInformationAtIndex(undoneMove.capturedPiece, undoneMove.capturedPieceSquare)
-        self.updateMoveInformation()
-
-    def updateBoardWithMove(self, chosenMove, undoing=False):
-        if (chosenMove.capturedPiece != piece.none):
-            self.setPieceInformationAtIndex(piece.none, chosenMove.capturedPieceSquare)
-
-        currentPiece = self.board[chosenMove.startSquare]
-        currentPieceType = piece.pieceToPieceType(currentPiece)
-        if currentPieceType == piece.pawn:  # pawn promotion
-            file,rank = util.squareIndexToRelativeCoordinate(chosenMove.endSquare)
-            if rank == 0 or rank == 7:  # update the pieceLists 
-                chosenPiece = promotionScreen.choosePromotionForPawn()
-                if chosenPiece == 'queen': currentPiece = piece.queen
-                elif chosenPiece == 'rook': currentPiece = piece.rook
-                elif chosenPiece == 'bishop': currentPiece = piece.bishop
-                else: currentPiece = piece.knight
-                currentPiece = currentPiece | (piece.white if self.whiteToMove else piece.black) 
-        elif currentPieceType == piece.king and not undoing:    # moving king disables all castle rights
-            kingColor = 'white' if self.whiteToMove else 'black'
-            self.castlingRights.disableCastleMove([kingColor + 'QueenSide', kingColor + 'KingSide'])
-        elif currentPieceType == piece.rook and not undoing:    # moving rook disables one side castle rights
-            kingColor = 'white' if self.whiteToMove else 'black'
-            castleSide = 'QueenSide' if chosenMove.startSquare % 8 == 0 else 'KingSide'
-            self.castlingRights.disableCastleMove([kingColor + castleSide])
-
-        self.setPieceInformationAtIndex(currentPiece, chosenMove.endSquare)
-        self.setPieceInformationAtIndex(piece.none, chosenMove.startSquare)
-        if chosenMove.isCastle:
-            if not undoing:
-                rookSide = 1 if chosenMove.endSquare < chosenMove.startSquare else -1
-                rookSquare = chosenMove.endSquare + rookSide
-                noPieceSquare = chosenMove.endSquare-2 if rookSide == 1 else chosenMove.endSquare+1
-            else:
-                rookSide = 1 if chosenMove.startSquare < chosenMove.endSquare else -1
-                noPieceSquare = chosenMove.startSquare + rookSide 
-                rookSquare = round(noPieceSquare/8)*8
-                if rookSquare > noPieceSquare: rookSquare -= 1
-        
-            rookColor = piece.white if piece.isWhite(currentPiece) else piece.black
-            self.setPieceInformationAtIndex(piece.rook | rookColor, rookSquare)
-            self.setPieceInformationAtIndex(piece.none, noPieceSquare)
+        # positions that are no longer on the path are dropped, or a search would leave a key behind for every node
+        if self.positionCounts[self.hashKey] == 1:
+            del self.positionCounts[self.hashKey]
+        else:
+            self.positionCounts[self.hashKey] -= 1
+        self.plyCount -= 1
+        ply = self.plyCount
+        undoneMove = self.undoMoves[ply]
+        self.whiteToMove = not self.whiteToMove
+        if not self.whiteToMove:
+            self.fullmoveNumber -= 1
+
+        startSquare = moveEncoding.startSquare(undoneMove)
+        endSquare = moveEncoding.endSquare(undoneMove)
+        capturedPiece = moveEncoding.capturedPiece(undoneMove)
+        pieceColor = piece.white if self.whiteToMove else piece.black
+        currentPiece = piece.pawn | pieceColor if moveEncoding.promotionPieceType(undoneMove) else self.board[endSquare]
+
+        if moveEncoding.isCastle(undoneMove):
+            rookStartSquare, rookEndSquare = board.castlingRookSquares(startSquare, endSquare)
+            self.setPieceInformationAtIndex(piece.none, rookEndSquare)
+            self.setPieceInformationAtIndex(piece.rook | pieceColor, rookStartSquare)
+        self.setPieceInformationAtIndex(piece.none, endSquare)
+        self.setPieceInformationAtIndex(currentPiece, startSquare)
+        if capturedPiece != piece.none:
+            self.setPieceInformationAtIndex(capturedPiece, moveEncoding.capturedPieceSquare(undoneMove))
+
+        self.castlingRights.rights = self.undoCastlingRights[ply]
+        self.enPassantSquare = self.undoEnPassantSquares[ply]
+        self.halfmoveClock = self.undoHalfmoveClocks[ply]
+        self.hashKey = self.hashHistory[ply]
+        self.legalMovesCache = None
+
+    def castlingRookSquares(kingStartSquare, kingEndSquare):
+        if kingEndSquare > kingStartSquare:
+            return kingStartSquare + 3, kingStartSquare + 1
+        return kingStartSquare - 4, kingStartSquare - 1
+
+    def inCheck(self):
+        return self.isSquareAttacked(self.kingSquare(self.whiteToMove), not self.whiteToMove)
+
+    def isCheckmate(self):
+        return not any(self.legalMoves.values()) and self.checkers != 0
+
+    # captures, pawn moves and lost castling rights all change the key for good,
+    # so counting keys along the game is enough and needs no scan back through the history
+    def isRepetition(self, times=2):
+        return self.positionCounts.get(self.hashKey, 0) >= times
+
+    def isFiftyMoveDraw(self):
+        return self.halfmoveClock >= 100
 
     def setPieceInformationAtIndex(self, currentPiece, squareIndex):
-        pieceType = piece.pieceToPieceType(currentPiece)
-        pieceListIndex = board.pieceToListIndex(currentPiece)
-        self.bitboards[pieceType-1] ^= np.uint64(squareIndex)
-        self.board[squareIndex] = currentPiece
+        previousPiece = self.board[squareIndex]
+        mask = np.uint64(1 << squareIndex)
+        if previousPiece != piece.none:
+            pieceListIndex = board.pieceToListIndex(previousPiece)
+            self.bitboards[pieceListIndex] ^= mask
+            self.bitboards[board.pieceToColorIndex(previousPiece)] ^= mask
+            self.bitboards[bitboards.allPieces] ^= mask
+            self.pieceLists[pieceListIndex].remove(squareIndex)
+            self.hashKey ^= zobrist.pieceKeys[pieceListIndex][squareIndex]
+            self.middlegameScore -= evaluation.middlegameScores[pieceListIndex][squareIndex]
+            self.endgameScore -= evaluation.endgameScores[pieceListIndex][squareIndex]
+            self.gamePhase -= evaluation.piecePhases[pieceListIndex]
 
         if currentPiece != piece.none:
+            pieceListIndex = board.pieceToListIndex(currentPiece)
+            self.bitboards[pieceListIndex] ^= mask
+            self.bitboards[board.pieceToColorIndex(currentPiece)] ^= mask
+            self.bitboards[bitboards.allPieces] ^= mask
             self.pieceLists[pieceListIndex].append(squareIndex)
-        else:
-            for pieceList in self.pieceLists:
-                if squareIndex in pieceList:
-                    pieceList.remove(squareIndex)
-                    return
+            self.hashKey ^= zobrist.pieceKeys[pieceListIndex][squareIndex]
+            self.middlegameScore += evaluation.middlegameScores[pieceListIndex][squareIndex]
+            self.endgameScore += evaluation.endgameScores[pieceListIndex][squareIndex]
+            self.gamePhase += evaluation.piecePhases[pieceListIndex]
+        self.board[squareIndex] = currentPiece
                 
     def verifySelection(self, squareIndex):
         chosenPiece = self.board[squareIndex]
@@ -535,21 +578,24 @@ class board:
         return (piece.isWhite(chosenPiece) == self.whiteToMove)
     
     def pieceToListIndex(currentPiece):
-        pieceType = piece.pieceToPieceType(currentPiece)
+        pieceType = int(piece.pieceToPieceType(currentPiece))
         offset = -1 if piece.isWhite(currentPiece) else 5
         return pieceType + offset
-        
-    def addMoveData(self, squareIndex, newSquareIndex, capturedPiece, capturedPieceSquare, isCastle=False):
-        if capturedPiece != piece.none and (piece.isWhite(capturedPiece) == self.whiteToMove): return   # can't attack self
 
-        self.piecesLegalMoves.append(move(squareIndex, newSquareIndex, capturedPiece, capturedPieceSquare, isCastle))
+    def pieceToColorIndex(currentPiece):
+        return bitboards.whitePieces if piece.isWhite(currentPiece) else bitboards.blackPieces
+        
+    # callers only pass empty or enemy occupied target squares
+    def addMoveData(self, squareIndex, newSquareIndex, capturedPiece, flags=0, promotionPieceType=piece.none):
+        self.moveBuffer[self.nMoves] = moveEncoding.encodeMove(squareIndex, newSquareIndex, capturedPiece, flags, promotionPieceType)
+        self.nMoves += 1
 
     def displayLegalMoves(self):
         for pieceSquare, moves in self.legalMoves.items():
             print('possible moves for : ' + self.pieceInformationString(pieceSquare))
-            for move in moves:
-                print('End Square: ' + self.pieceInformationString(move.endSquare))
-                if move.capturedPiece != 0: print('Captured piece square: ' + self.pieceInformationString(move.capturedPieceSquare))
+            for legalMove in moves:
+                print('Move: ' + moveEncoding.moveToString(legalMove) + ', end square: ' + self.pieceInformationString(moveEncoding.endSquare(legalMove)))
+                if moveEncoding.capturedPiece(legalMove) != 0: print('Captured piece square: ' + self.pieceInformationString(moveEncoding.capturedPieceSquare(legalMove)))
 
     def pieceInformationString(self, pieceSquare):
         currentPiece = self.board[pieceSquare]
@@ -558,57 +604,108 @@ class board:
         file,rank = util.squareIndexToRelativeCoordinate(pieceSquare)
         return pieceColor + piece.pieceMap[pieceType] + ' at file ' + str(file) + ', rank ' + str(rank)
 
+    # a board in the same game (replayed from initialFen, so repetitions still count) sharing this one's
+    # transposition table and AI settings, for searching on another thread while this one is drawn and played on
+    def searchCopy(self):
+        boardCopy = board(False, self.initialFen)
+        for loggedMove in self.moveLog:
+            boardCopy.makeMove(loggedMove)
+        boardCopy.transpositionTable = self.transpositionTable
+        boardCopy.aiSearchLimits = dict(self.aiSearchLimits)
+        boardCopy.aiWorkers = self.aiWorkers
+        boardCopy.openingBook = self.openingBook
+        boardCopy.tablebases = self.tablebases
+        return boardCopy
+
+    # a move picked from the opening book by weight, noMove out of book
+    def bookMove(self):
+        return self.openingBook.chooseMove(self) if self.openingBook is not None else moveEncoding.noMove
+
+    # how the AI picks its move, without playing it: a book move, else a search within aiSearchLimits (with
+    # aiWorkers processes when there are several). a searcher made by the caller, so it can stop the search or
+    # change its clock, is used instead of a new one
+    def searchAIMove(self, searcher=None):
+        bookMove = self.bookMove()
+        if bookMove != moveEncoding.noMove:
+            return search.SearchResult(bookMove, 0, 0, 0, 0.0, [bookMove])
+        if searcher is None:
+            searcher = search.Searcher(self, **self.aiSearchLimits)
+        if self.aiWorkers > 1:
+            return parallelSearch.searchWithHelpers(searcher, self.aiWorkers)
+        return searcher.search()
+
+    # plays the AI's move, returns if checkmate. the search's result is left in lastSearchResult for the caller to report
     def makeAIMove(self):
-        aiMove = self.getBestMove()
-        return self.makeMove(aiMove)
-
-    def findCurrentPlayersKingSquareIndex(self):
-        return np.argmax(self.board == (self.whiteToMove * 8) + 9)
-    
-    def getRandomMove(self):
-        aiMoves = []
-        while len(aiMoves) == 0:
-            chosenPiece = choice(list(self.legalMoves.keys()))
-            aiMoves = self.legalMoves[chosenPiece]
-        return choice(aiMoves)
-
-    def getBestMove(self):
-        bestMove = None
-        bestPieceCapture = -1
-
-        def searchForBestMove(squareIndex):
-            nonlocal bestMove, bestPieceCapture
-
-            possibleMoves = self.legalMoves[squareIndex]
-            for possibleMove in possibleMoves:
-                capturedPieceValue = piece.values[piece.pieceToPieceType(possibleMove.capturedPiece)]
-                if capturedPieceValue > bestPieceCapture:
-                    bestMove = possibleMove
-                    bestPieceCapture = capturedPieceValue
-        
-        self.iteratePieces(searchForBestMove)
-        if bestMove.capturedPiece == piece.none:
-            return self.getRandomMove()
-        return bestMove
+        self.lastSearchResult = self.searchAIMove()
+        if self.lastSearchResult.bestMove != moveEncoding.noMove:
+            self.makeMove(self.lastSearchResult.bestMove)
+        return self.isCheckmate()
     
 class CastlingRights:
-    def __init__(self, whiteQueenSide=True, whiteKingSide=True, blackQueenSide=True, blackKingSide=True):
-        self.possibleCastles = {
-            'whiteQueenSide': whiteQueenSide,
-            'whiteKingSide': whiteKingSide,
-            'blackQueenSide': blackQueenSide,
-            'blackKingSide': blackKingSide
-        }
-        self.savedStates = []
-
-    def saveCastleState(self):
-        self.savedStates.append(self.possibleCastles.copy())
-
-    def disableCastleMove(self, moveTypeList):
-        for moveType in moveTypeList:
-            self.possibleCastles[moveType] = False
-
-    def undoCastleMove(self):
-        if len(self.savedStates) == 0: 
-            return
-        self.possibleCastles = self.savedStates.pop()
\ No newline at end of file
+    whiteKingSide = 1
+    whiteQueenSide = 2
+    blackKingSide = 4
+    blackQueenSide = 8
+    allRights = whiteKingSide | whiteQueenSide | blackKingSide | blackQueenSide
+
+    # moving a king or rook off, or capturing on, one of these squares loses those rights
+    squareCastlingRights = {
+        60: whiteKingSide | whiteQueenSide,
+        56: whiteQueenSide,
+        63: whiteKingSide,
+        4: blackKingSide | blackQueenSide,
+        0: blackQueenSide,
+        7: blackKingSide
+    }
+
+    fenSymbols = {
+        'K': whiteKingSide,
+        'Q': whiteQueenSide,
+        'k': blackKingSide,
+        'q': blackQueenSide
+    }
+
+    def __init__(self, rights=allRights):
+        self.rights = rights
+
+    def fromFen(fenCastling):
+        return CastlingRights(sum(CastlingRights.fenSymbols.get(symbol, 0) for symbol in fenCastling))
+
+    def toFen(self):
+        return ''.join(symbol for symbol, castleRight in CastlingRights.fenSymbols.items() if self.rights & castleRight) or '-'
+
+    def canCastle(self, castleRight):
+        return bool(self.rights & castleRight)
+
+    def updateForMove(self, startSquare, endSquare):
+        self.rights &= ~(CastlingRights.squareCastlingRights.get(startSquare, 0) | CastlingRights.squareCastlingRights.get(endSquare, 0))
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    import batchPerft
+
+    parser = argparse.ArgumentParser(description='Positions loaded per second from FEN, each checked to write back the same FEN')
+    parser.add_argument('--epd', help='file of FEN/EPD positions, one per line, defaults to the FENs above')
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.epd:
+        fens = [fen + ' 0 1' for fen in batchPerft.readEpd(args.epd)]
+    else:
+        fens = [board.startingFen, board.pawnPromotionFen, board.allCastlingPossibleFen, board.piecePinnedFen, board.checkmateFen,
+                'rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 37 80']
+
+    chessBoard = board(False)
+    for fen in fens:
+        chessBoard.initBoard(fen)
+        assert chessBoard.positionAsFen() == fen, (fen, chessBoard.positionAsFen())
+
+    startTime = time.perf_counter()
+    for _ in range(args.repeats):
+        for fen in fens:
+            chessBoard.initBoard(fen)
+    elapsed = time.perf_counter() - startTime
+    nLoads = args.repeats * len(fens)
+    print(f"{nLoads} positions loaded in {elapsed:.2f}s, {nLoads / elapsed:.0f} positions/s, {elapsed / nLoads * 1e6:.0f} µs each")
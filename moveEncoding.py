@@ -0,0 +1,65 @@
+from array import array
+
+import piece
+import util
+
+# moves are packed into a single int:
+# bits 0-5 start square | 6-11 end square | 12-14 flags | 15-17 promotion piece type | 18-22 captured piece
+squareMask = 0b111111
+endSquareShift = 6
+flagsShift = 12
+promotionShift = 15
+capturedPieceShift = 18
+
+castleFlag = 1
+enPassantFlag = 2
+doublePawnPushFlag = 4
+
+noMove = 0  # start and end square are the same, so no legal move encodes to 0
+promotionPieceTypes = [piece.queen, piece.rook, piece.bishop, piece.knight]
+
+maxMovesPerPosition = 256   # the most legal moves in any known position is 218
+maxPly = 128
+
+def encodeMove(startSquare, endSquare, capturedPiece=piece.none, flags=0, promotionPieceType=piece.none):
+    return (startSquare | (endSquare << endSquareShift) | (flags << flagsShift) |
+            (promotionPieceType << promotionShift) | (int(capturedPiece) << capturedPieceShift))
+
+def startSquare(encodedMove):
+    return encodedMove & squareMask
+
+def endSquare(encodedMove):
+    return (encodedMove >> endSquareShift) & squareMask
+
+def flags(encodedMove):
+    return (encodedMove >> flagsShift) & 0b111
+
+def promotionPieceType(encodedMove):
+    return (encodedMove >> promotionShift) & 0b111
+
+def capturedPiece(encodedMove):
+    return encodedMove >> capturedPieceShift
+
+def isCastle(encodedMove):
+    return bool(flags(encodedMove) & castleFlag)
+
+def isEnPassant(encodedMove):
+    return bool(flags(encodedMove) & enPassantFlag)
+
+def isDoublePawnPush(encodedMove):
+    return bool(flags(encodedMove) & doublePawnPushFlag)
+
+# an en passant capture takes the pawn on the start rank and end file
+def capturedPieceSquare(encodedMove):
+    if isEnPassant(encodedMove):
+        return (startSquare(encodedMove) & ~7) | (endSquare(encodedMove) & 7)
+    return endSquare(encodedMove)
+
+# one preallocated buffer per search ply, the 23 bit moves don't fit in 'H' so 'I' is used
+def createMoveBuffers(nPly=maxPly):
+    return [array('I', [noMove]) * maxMovesPerPosition for _ in range(nPly)]
+
+# display helper
+def moveToString(encodedMove):
+    promotionSymbol = {piece.none: '', piece.queen: 'q', piece.rook: 'r', piece.bishop: 'b', piece.knight: 'n'}
+    return util.squareIndexToSquareName(startSquare(encodedMove)) + util.squareIndexToSquareName(endSquare(encodedMove)) + promotionSymbol[promotionPieceType(encodedMove)]
@@ -0,0 +1,114 @@
+import argparse
+from array import array
+
+import moveEncoding
+import piece
+
+# score bands, every capture sorts above every quiet move
+hashMoveScore = 1 << 30
+captureScore = 1 << 24
+promotionScore = 1 << 23
+killerScore = 1 << 22
+maxHistoryScore = killerScore - 1
+
+killersPerPly = 2
+
+# scores moves before they are searched: the TT/PV move, captures by MVV-LVA (most valuable victim,
+# least valuable attacker), promotions, this ply's killer moves and then quiet moves by their history
+class MoveOrderer:
+    def __init__(self, nPly=moveEncoding.maxPly):
+        # quiet moves that caused a beta cutoff at the same ply in a sibling node
+        self.killers = [[moveEncoding.noMove] * killersPerPly for _ in range(nPly)]
+        # butterfly table indexed by side to move, start square and end square
+        self.history = array('I', [0]) * (2 * 64 * 64)
+
+    def clear(self):
+        for plyKillers in self.killers:
+            plyKillers[:] = [moveEncoding.noMove] * killersPerPly
+        self.history = array('I', [0]) * (2 * 64 * 64)
+
+    def historyIndex(whiteToMove, encodedMove):
+        return (0 if whiteToMove else 4096) | (encodedMove & 0xfff)  # the low 12 bits are start and end square
+
+    def scoreMove(self, chessBoard, encodedMove, plyKillers, hashMove):
+        if encodedMove == hashMove:
+            return hashMoveScore
+        score = 0
+        capturedPiece = moveEncoding.capturedPiece(encodedMove)
+        if capturedPiece != piece.none:
+            attackerType = piece.pieceToPieceType(chessBoard.board[moveEncoding.startSquare(encodedMove)])
+            score = captureScore + piece.values[piece.pieceToPieceType(capturedPiece)] * 16 - piece.values[int(attackerType)]
+        if promotionPieceType := moveEncoding.promotionPieceType(encodedMove):
+            score += promotionScore + piece.values[promotionPieceType]
+        if score:
+            return score
+        if encodedMove in plyKillers:
+            return killerScore + killersPerPly - plyKillers.index(encodedMove)
+        return self.history[MoveOrderer.historyIndex(chessBoard.whiteToMove, encodedMove)]
+
+    # sorts the first nMoves of the buffer in place, best first
+    def orderMoves(self, chessBoard, moveBuffer, nMoves, ply, hashMove=moveEncoding.noMove):
+        plyKillers = self.killers[ply]
+        moves = sorted(moveBuffer[:nMoves], key=lambda encodedMove: self.scoreMove(chessBoard, encodedMove, plyKillers, hashMove), reverse=True)
+        moveBuffer[:nMoves] = array('I', moves)
+
+    # yields the legal moves of the position at this search ply in stages, each generated only once the
+    # previous one runs out: the hash move, captures and promotions by MVV-LVA, then quiet moves with
+    # the killers first. a cutoff stops the generator before the later stages cost anything.
+    # capturesOnly stops after the captures, for quiescence search
+    def stagedMoves(self, chessBoard, ply, hashMove=moveEncoding.noMove, capturesOnly=False):
+        bufferIndex = ply + 1   # ply 0's buffer backs board.legalMoves
+        moveBuffer = chessBoard.moveBuffers[bufferIndex]
+        plyKillers = self.killers[ply]
+        if hashMove != moveEncoding.noMove:
+            if capturesOnly and MoveOrderer.isQuiet(hashMove) or not chessBoard.isLegalMove(bufferIndex, hashMove):
+                hashMove = moveEncoding.noMove
+            else:
+                yield hashMove
+
+        stages = [(True, False)] if capturesOnly else [(True, False), (False, True)]
+        for captures, quiets in stages:
+            nMoves = chessBoard.generateLegalMoves(bufferIndex, captures, quiets)
+            moves = sorted(moveBuffer[:nMoves], key=lambda encodedMove: self.scoreMove(chessBoard, encodedMove, plyKillers, hashMove), reverse=True)
+            for encodedMove in moves:
+                if encodedMove != hashMove:
+                    yield encodedMove
+
+    def isQuiet(encodedMove):
+        return moveEncoding.capturedPiece(encodedMove) == piece.none and moveEncoding.promotionPieceType(encodedMove) == piece.none
+
+    # quiet moves that cause a beta cutoff become killers and gain history, deeper cutoffs gain more
+    def updateForCutoff(self, chessBoard, encodedMove, depth, ply):
+        if not MoveOrderer.isQuiet(encodedMove):
+            return
+        plyKillers = self.killers[ply]
+        if plyKillers[0] != encodedMove:
+            plyKillers[1:] = plyKillers[:-1]
+            plyKillers[0] = encodedMove
+
+        historyIndex = MoveOrderer.historyIndex(chessBoard.whiteToMove, encodedMove)
+        self.history[historyIndex] += depth * depth
+        if self.history[historyIndex] > maxHistoryScore:
+            # keep the relative order but stay below the killer band
+            for i in range(len(self.history)):
+                self.history[i] >>= 1
+
+if __name__ == "__main__":
+    import gameBoard
+    import search
+
+    parser = argparse.ArgumentParser(description='Compare searched nodes with and without move ordering')
+    parser.add_argument('--fen', action='append', help='may be given more than once, defaults to the start and kiwipete positions')
+    parser.add_argument('--depth', type=int, default=4)
+    args = parser.parse_args()
+    fens = args.fen or [gameBoard.board.startingFen, 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1']
+
+    for orderMoves in (False, True):
+        nodes = 0
+        elapsed = 0
+        for fen in fens:
+            result = search.Searcher(gameBoard.board(False, fen), args.depth, orderMoves=orderMoves).search()
+            nodes += result.nodes
+            elapsed += result.elapsed
+            print(f"ordering {'on ' if orderMoves else 'off'}  {result}")
+        print(f"ordering {'on ' if orderMoves else 'off'}  total nodes {nodes}  time {elapsed:.2f}s\n")
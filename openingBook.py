@@ -0,0 +1,195 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from collections import defaultdict
+
+import moveEncoding
+import piece
+import polyglotKeys
+
+# Polyglot .bin opening books: 16 byte big-endian entries (key, move, weight, learn) sorted by key.
+# the file is memory mapped and binary searched in place, nothing is read until a position is probed
+
+entryFormat = struct.Struct('>QHHI')
+keyFormat = struct.Struct('>Q')
+defaultBookPath = 'books/book.bin'
+maxWeight = 0xFFFF
+
+# polyglot's piece kinds, black pawn 0, white pawn 1, black knight 2 ... white king 11
+pieceKinds = {piece.pawn: 0, piece.knight: 1, piece.bishop: 2, piece.rook: 3, piece.queen: 4, piece.king: 5}
+castlingKeyIndices = [(1, 768), (2, 769), (4, 770), (8, 771)]  # CastlingRights bit, key index
+
+def polyglotSquare(squareIndex):
+    return (7 - squareIndex // 8) * 8 + squareIndex % 8
+
+# the en passant file only counts when a pawn of the side to move stands next to the pawn that just moved two squares
+def enPassantCapturable(chessBoard):
+    if chessBoard.enPassantSquare < 0:
+        return False
+    pawnRankOffset = 8 if chessBoard.whiteToMove else -8
+    ownPawn = (piece.white if chessBoard.whiteToMove else piece.black) | piece.pawn
+    file = chessBoard.enPassantSquare % 8
+    return any(0 <= file + fileStep < 8 and chessBoard.board[chessBoard.enPassantSquare + pawnRankOffset + fileStep] == ownPawn for fileStep in (-1, 1))
+
+def polyglotHash(chessBoard):
+    key = 0
+    for squareIndex, currentPiece in enumerate(chessBoard.board.tolist()):
+        if currentPiece != piece.none:
+            kind = 2 * pieceKinds[piece.pieceToPieceType(currentPiece)] + piece.isWhite(currentPiece)
+            key ^= polyglotKeys.randomArray[64 * kind + polyglotSquare(squareIndex)]
+    for castleRight, keyIndex in castlingKeyIndices:
+        if chessBoard.castlingRights.rights & castleRight:
+            key ^= polyglotKeys.randomArray[keyIndex]
+    if enPassantCapturable(chessBoard):
+        key ^= polyglotKeys.randomArray[772 + chessBoard.enPassantSquare % 8]
+    if chessBoard.whiteToMove:
+        key ^= polyglotKeys.randomArray[780]
+    return key
+
+# to square, from square and promotion packed in 15 bits. castling is written as the king taking its own rook
+def polyglotMove(encodedMove):
+    startSquare, endSquare = moveEncoding.startSquare(encodedMove), moveEncoding.endSquare(encodedMove)
+    if moveEncoding.isCastle(encodedMove):
+        endSquare = (endSquare & ~7) | (7 if endSquare % 8 == 6 else 0)
+    promotionPieceType = moveEncoding.promotionPieceType(encodedMove)
+    promotion = promotionPieceType - piece.pawn if promotionPieceType != piece.none else 0
+    return polyglotSquare(endSquare) | polyglotSquare(startSquare) << 6 | promotion << 12
+
+def legalMovesByPolyglotMove(chessBoard):
+    return {polyglotMove(legalMove): legalMove for pieceMoves in chessBoard.legalMoves.values() for legalMove in pieceMoves}
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        # mmap can't map an empty file
+        self.entryData = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(self.file.fileno()).st_size else b''
+        self.nEntries = len(self.entryData) // entryFormat.size
+
+    def close(self):
+        if isinstance(self.entryData, mmap.mmap):
+            self.entryData.close()
+        self.file.close()
+
+    def keyAt(self, entryIndex):
+        return keyFormat.unpack_from(self.entryData, entryIndex * entryFormat.size)[0]
+
+    # index of the first entry with this key (or where it would be)
+    def firstEntry(self, key):
+        low, high = 0, self.nEntries
+        while low < high:
+            middle = (low + high) // 2
+            if self.keyAt(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # (polyglot move, weight) of every entry for the key
+    def entries(self, key):
+        entryIndex = self.firstEntry(key)
+        while entryIndex < self.nEntries:
+            entryKey, move, weight, _ = entryFormat.unpack_from(self.entryData, entryIndex * entryFormat.size)
+            if entryKey != key:
+                break
+            yield move, weight
+            entryIndex += 1
+
+    # (encoded move, weight) for the book's moves in this position, moves that aren't legal here are skipped
+    def bookMoves(self, chessBoard):
+        entries = list(self.entries(polyglotHash(chessBoard)))
+        if not entries:
+            return []
+        legalMoves = legalMovesByPolyglotMove(chessBoard)
+        return [(legalMoves[move], weight) for move, weight in entries if move in legalMoves and weight > 0]
+
+    # a book move picked with probability proportional to its weight, noMove when the position isn't in the book
+    def chooseMove(self, chessBoard, randomGenerator=random):
+        bookMoves = self.bookMoves(chessBoard)
+        if not bookMoves:
+            return moveEncoding.noMove
+        moves, weights = zip(*bookMoves)
+        return randomGenerator.choices(moves, weights)[0]
+
+openBooks = {}  # path -> OpeningBook or None when there is no file, so every board shares one mapping
+
+def openBook(path=defaultBookPath):
+    if path not in openBooks:
+        openBooks[path] = OpeningBook(path) if os.path.isfile(path) else None
+    return openBooks[path]
+
+# games are lines of moves in UCI notation from the starting position, like "e2e4 e7e5 g1f3 ...".
+# a leading "position startpos moves" (UCI logs) is skipped and a trailing result (1-0, 0-1, 1/2-1/2, *)
+# weights the moves: 2 for each move of the winner, 1 for a draw or unknown result, 0 for the loser's
+def readGames(path):
+    with open(path) as gameFile:
+        for line in gameFile:
+            tokens = line.split()
+            if 'moves' in tokens:
+                tokens = tokens[tokens.index('moves')+1:]
+            elif tokens[:2] == ['position', 'startpos'] or tokens[:1] == ['startpos']:
+                tokens = []
+            result = tokens.pop() if tokens and tokens[-1] in ('1-0', '0-1', '1/2-1/2', '*') else '*'
+            if tokens:
+                yield tokens, result
+
+def moveWeight(result, whiteMoved):
+    if result == '1-0':
+        return 2 if whiteMoved else 0
+    if result == '0-1':
+        return 0 if whiteMoved else 2
+    return 1
+
+# {(key, polyglot move): weight} over the first maxPlies moves of every game
+def collectBookMoves(chessBoard, gamePaths, maxPlies):
+    weights = defaultdict(int)
+    for gamePath in gamePaths:
+        for gameNumber, (gameMoves, result) in enumerate(readGames(gamePath), 1):
+            chessBoard.initBoard()
+            for moveString in gameMoves[:maxPlies]:
+                legalMoves = {moveEncoding.moveToString(legalMove): legalMove for pieceMoves in chessBoard.legalMoves.values() for legalMove in pieceMoves}
+                if moveString not in legalMoves:
+                    print(f"{gamePath}: game {gameNumber}: illegal move {moveString}, rest of the game skipped", file=sys.stderr)
+                    break
+                weights[(polyglotHash(chessBoard), polyglotMove(legalMoves[moveString]))] += moveWeight(result, chessBoard.whiteToMove)
+                chessBoard.makeMove(legalMoves[moveString])
+    return weights
+
+# entries sorted by key, the heaviest move first within a key, weights scaled down to fit 16 bits
+def writeBook(weights, path, minWeight=1):
+    entries = [(key, move, weight) for (key, move), weight in weights.items() if weight >= minWeight]
+    heaviest = max((weight for _, _, weight in entries), default=0)
+    scale = maxWeight / heaviest if heaviest > maxWeight else 1
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    with open(path, 'wb') as bookFile:
+        for key, move, weight in entries:
+            bookFile.write(entryFormat.pack(key, move, max(int(weight * scale), 1), 0))
+    return len(entries)
+
+if __name__ == "__main__":
+    import gameBoard
+
+    parser = argparse.ArgumentParser(description='Build a Polyglot opening book from game files, or list the book moves of a position')
+    parser.add_argument('--book', default=defaultBookPath)
+    parser.add_argument('--games', nargs='+', help='build --book from these files, one game of UCI moves per line')
+    parser.add_argument('--plies', type=int, default=20, help='moves of each game that go into the book')
+    parser.add_argument('--min-weight', type=int, default=1, help='leave out moves with less total weight')
+    parser.add_argument('--fen', default=gameBoard.board.startingFen, help='position to list the book moves of')
+    args = parser.parse_args()
+
+    chessBoard = gameBoard.board(False)
+    if args.games:
+        os.makedirs(os.path.dirname(args.book) or '.', exist_ok=True)
+        nEntries = writeBook(collectBookMoves(chessBoard, args.games, args.plies), args.book, args.min_weight)
+        print(f"{nEntries} entries written to {args.book}")
+    else:
+        book = OpeningBook(args.book)
+        chessBoard.initBoard(args.fen)
+        bookMoves = sorted(book.bookMoves(chessBoard), key=lambda bookMove: -bookMove[1])
+        totalWeight = sum(weight for _, weight in bookMoves)
+        print(f"key {polyglotHash(chessBoard):016x}, {book.nEntries} entries in {args.book}")
+        for bookMove, weight in bookMoves:
+            print(f"{moveEncoding.moveToString(bookMove):<6} weight {weight:>5}  {weight / totalWeight:.1%}")
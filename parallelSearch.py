@@ -0,0 +1,96 @@
+import argparse
+import multiprocessing
+import queue
+import threading
+import time
+
+import moveEncoding
+import search
+import transpositionTable
+
+helperResultTimeout = 5.0   # seconds to wait for a stopped helper to report its node count
+
+# lazy SMP: helper processes search the same root as the main search, without any split points or
+# communication beyond a transposition table in shared memory. helpers start at alternating depths so
+# they get ahead of the main search and fill the table with results it will want. the main search's
+# result is the answer, helpers are stopped as soon as it finishes
+def searchInParallel(chessBoard, nWorkers, maxDepth=search.maxSearchDepth, maxNodes=None, maxTime=None, onIteration=None):
+    return searchWithHelpers(search.Searcher(chessBoard, maxDepth, maxNodes, maxTime, onIteration), nWorkers)
+
+# runs an already set up main search with helpers, so whoever made the searcher can still stop it
+def searchWithHelpers(mainSearcher, nWorkers):
+    startTime = time.perf_counter()
+    chessBoard = mainSearcher.board
+    table = chessBoard.transpositionTable
+    if table is None or table.sharedMemory is None:
+        sizeInMB = table.sizeInMB if table is not None else transpositionTable.defaultSizeMB
+        table = chessBoard.transpositionTable = mainSearcher.transpositionTable = transpositionTable.TranspositionTable(sizeInMB, shared=True)
+
+    context = multiprocessing.get_context()
+    stopEvent = context.Event()
+    helperResults = context.Queue()
+    helpers = [context.Process(target=helperSearch, daemon=True,
+                               args=(chessBoard.initialFen, chessBoard.moveLog, table.sharedName, table.sizeInMB, table.age,
+                                     1 + workerIndex % 2, stopEvent, helperResults))
+               for workerIndex in range(1, nWorkers)]
+    for helper in helpers:
+        helper.start()
+
+    try:
+        result = mainSearcher.search()
+    finally:
+        stopEvent.set()
+        helperNodes = helperQnodes = 0
+        for _ in helpers:
+            try:
+                nodes, qnodes = helperResults.get(timeout=helperResultTimeout)
+            except queue.Empty:
+                break
+            helperNodes += nodes
+            helperQnodes += qnodes
+        for helper in helpers:
+            helper.join(helperResultTimeout)
+            if helper.is_alive():
+                helper.terminate()
+
+    # nodes from every worker, over the wall clock time including starting the helpers
+    result.nodes += helperNodes
+    result.qnodes += helperQnodes
+    result.elapsed = time.perf_counter() - startTime
+    return result
+
+# runs in a helper process, the game is rebuilt from its starting fen and move log so repetitions still count
+def helperSearch(initialFen, moveLog, tableName, tableSizeMB, tableAge, startDepth, stopEvent, helperResults):
+    import gameBoard    # gameBoard imports this module
+
+    chessBoard = gameBoard.board(False, initialFen)
+    for loggedMove in moveLog:
+        chessBoard.makeMove(loggedMove)
+    chessBoard.transpositionTable = transpositionTable.TranspositionTable(tableSizeMB, sharedName=tableName)
+    chessBoard.transpositionTable.age = tableAge  # bumped to the main search's age by newSearch
+
+    searcher = search.Searcher(chessBoard, startDepth=startDepth)
+    threading.Thread(target=lambda: (stopEvent.wait(), searcher.stop()), daemon=True).start()
+    result = searcher.search()
+    helperResults.put((result.nodes, result.qnodes))
+
+if __name__ == "__main__":
+    import gameBoard
+
+    parser = argparse.ArgumentParser(description='Time to depth and nodes/second of the parallel search from 1 to N workers')
+    parser.add_argument('--fen', default='r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1')
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--hash', type=float, default=transpositionTable.defaultSizeMB, help='shared transposition table size in MB')
+    args = parser.parse_args()
+
+    baseline = None
+    for nWorkers in range(1, args.workers + 1):
+        chessBoard = gameBoard.board(False, args.fen)
+        chessBoard.transpositionTable = transpositionTable.TranspositionTable(args.hash, shared=True)
+        depthTimes = []
+        result = searchInParallel(chessBoard, nWorkers, args.depth, onIteration=lambda iteration: depthTimes.append(iteration.elapsed))
+        baseline = baseline or result.elapsed
+        timeToDepth = ' '.join(f"{depthTime:.2f}" for depthTime in depthTimes)
+        print(f"workers {nWorkers:>2}  time to depth {timeToDepth}  total {result.elapsed:.2f}s  speedup {baseline / result.elapsed:.2f}  "
+              f"nodes {result.nodes + result.qnodes}  nps {result.nodesPerSecond}  best {moveEncoding.moveToString(result.bestMove)}")
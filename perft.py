@@ -0,0 +1,106 @@
+import argparse
+import time
+
+import gameBoard
+import moveEncoding
+
+# known node counts per depth, starting at depth 1
+perftSuite = [
+    ('startpos', gameBoard.board.startingFen, [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', [48, 2039, 97862, 4085603]),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238, 674624, 11030083]),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 264, 9467, 422333, 15833292]),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379, 2103487]),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10', [46, 2079, 89890, 3894594]),
+    ('illegalEnPassant1', '3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1', [18, 92, 1670, 10138, 185429]),
+    ('illegalEnPassant2', '8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1', [13, 102, 1266, 10276, 135655]),
+    ('enPassantGivesCheck', '8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1', [15, 126, 1928, 13931, 206379]),
+    ('shortCastleGivesCheck', '5k2/8/8/8/8/8/8/4K2R w K - 0 1', [15, 66, 1198, 6399, 120330]),
+    ('longCastleGivesCheck', '3k4/8/8/8/8/8/8/R3K3 w Q - 0 1', [16, 71, 1286, 7418, 141077]),
+    ('castleRights', 'r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1', [26, 1141, 27826, 1274206]),
+    ('castlingPrevented', 'r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1', [44, 1494, 50509, 1720476]),
+    ('promoteOutOfCheck', '2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1', [11, 133, 1442, 19174, 266199]),
+    ('discoveredCheck', '8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1', [29, 165, 5160, 31961, 1004658]),
+    ('promoteToGiveCheck', '4k3/1P6/8/8/8/8/K7/8 w - - 0 1', [9, 40, 472, 2661, 38983, 217342]),
+    ('underpromoteToCheck', '8/P1k5/K7/8/8/8/8/8 w - - 0 1', [6, 27, 273, 1329, 18135, 92683]),
+    ('selfStalemate', 'K1k5/8/P7/8/8/8/8/8 w - - 0 1', [2, 6, 13, 63, 382, 2217]),
+    ('stalemateAndCheckmate', '8/k1P5/8/1K6/8/8/8/8 w - - 0 1', [10, 25, 268, 926, 10857, 43261]),
+    ('doubleCheck', '8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1', [37, 183, 6559, 23527, 811573]),
+]
+
+# ply 0's buffer backs board.legalMoves, so perft starts at ply 1
+def perft(chessBoard, depth, ply=1):
+    if depth == 0:
+        return 1
+    nMoves = chessBoard.generateLegalMoves(ply)
+    if depth == 1:  # bulk count the leaves
+        return nMoves
+
+    moveBuffer = chessBoard.moveBuffers[ply]
+    nodes = 0
+    for moveIndex in range(nMoves):
+        chessBoard.makeMove(moveBuffer[moveIndex])
+        nodes += perft(chessBoard, depth-1, ply+1)
+        chessBoard.unmakeMove()
+    return nodes
+
+def divide(chessBoard, depth):
+    nMoves = chessBoard.generateLegalMoves(1)
+    rootMoves = chessBoard.moveBuffers[1][:nMoves].tolist()
+    nodesPerMove = {}
+    for rootMove in rootMoves:
+        chessBoard.makeMove(rootMove)
+        nodesPerMove[moveEncoding.moveToString(rootMove)] = perft(chessBoard, depth-1, 2)
+        chessBoard.unmakeMove()
+    return nodesPerMove
+
+def timedPerft(fen, depth, showDivide=False):
+    chessBoard = gameBoard.board(False, fen)
+    startTime = time.perf_counter()
+    if showDivide:
+        nodesPerMove = divide(chessBoard, depth)
+        nodes = sum(nodesPerMove.values())
+    else:
+        nodesPerMove = {}
+        nodes = perft(chessBoard, depth)
+    elapsed = time.perf_counter() - startTime
+    return nodes, elapsed, nodesPerMove
+
+def nodesPerSecond(nodes, elapsed):
+    return int(nodes / elapsed) if elapsed > 0 else 0
+
+# runs every position at the deepest depth whose known count fits in maxNodes
+def runSuite(maxNodes, maxDepth=None):
+    totalNodes = 0
+    totalTime = 0
+    failures = 0
+    for name, fen, knownCounts in perftSuite:
+        depth = max([d for d, count in enumerate(knownCounts, 1) if count <= maxNodes] or [1])
+        if maxDepth is not None:
+            depth = min(depth, maxDepth)
+        nodes, elapsed, _ = timedPerft(fen, depth)
+        passed = nodes == knownCounts[depth-1]
+        failures += not passed
+        totalNodes += nodes
+        totalTime += elapsed
+        print(f"{name:<24} depth {depth}  nodes {nodes:>9}  expected {knownCounts[depth-1]:>9}  {nodesPerSecond(nodes, elapsed):>7} nps  {'ok' if passed else 'FAIL'}")
+
+    print(f"\nTotal nodes: {totalNodes}  time: {totalTime:.2f}s  nps: {nodesPerSecond(totalNodes, totalTime)}  failures: {failures}")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Headless perft and divide for the move generator')
+    parser.add_argument('--fen', default=gameBoard.board.startingFen)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--divide', action='store_true', help='print the node count under every root move')
+    parser.add_argument('--suite', action='store_true', help='run the positions with known node counts')
+    parser.add_argument('--max-nodes', type=int, default=50000, help='deepest suite depth whose known count fits in this')
+    args = parser.parse_args()
+
+    if args.suite:
+        raise SystemExit(1 if runSuite(args.max_nodes) else 0)
+
+    nodes, elapsed, nodesPerMove = timedPerft(args.fen, args.depth, args.divide)
+    for moveString, moveNodes in nodesPerMove.items():
+        print(f"{moveString}: {moveNodes}")
+    print(f"\nNodes: {nodes}\nTime: {elapsed:.3f}s\nNPS: {nodesPerSecond(nodes, elapsed)}")
@@ -0,0 +1,373 @@
+import argparse
+import time
+from dataclasses import dataclass
+
+import bitboards
+import evaluation
+import moveEncoding
+import moveOrdering
+import piece
+import staticExchange
+import tablebase
+import transpositionTable
+
+mateScore = 100000
+tablebaseWinScore = mateScore // 2   # a win the tablebases know of inside the search, below any mate the search finds itself
+infinity = 1000000
+aspirationWindow = 50   # centipawns either side of the previous iteration's score
+nodesBetweenTimeChecks = 256
+deltaMargin = 200   # centipawns a capture may gain on top of the captured piece's value before delta pruning skips it
+maxSearchDepth = moveEncoding.maxPly - 2    # ply 0's move buffer backs board.legalMoves
+
+@dataclass
+class SearchResult:
+    bestMove: int
+    score: int
+    depth: int
+    nodes: int
+    elapsed: float
+    principalVariation: list
+    hashFull: int = 0   # per mille of the transposition table used by this search
+    ttHitRate: float = 0.0
+    qnodes: int = 0     # quiescence nodes, counted apart from nodes
+    tablebaseHits: int = 0
+
+    @property
+    def nodesPerSecond(self):
+        return int((self.nodes + self.qnodes) / self.elapsed) if self.elapsed > 0 else 0
+
+    def __str__(self):
+        pv = ' '.join(moveEncoding.moveToString(pvMove) for pvMove in self.principalVariation)
+        return f"depth {self.depth} score {self.score} nodes {self.nodes} qnodes {self.qnodes} nps {self.nodesPerSecond} time {self.elapsed:.2f}s hashfull {self.hashFull} tthits {self.ttHitRate:.1%} tbhits {self.tablebaseHits} pv {pv}"
+
+def isMateScore(score):
+    return abs(score) >= mateScore - maxSearchDepth
+
+# mate scores count plies from the root, the table stores them counted from the position instead
+def scoreToTable(score, ply):
+    if isMateScore(score):
+        return score + ply if score > 0 else score - ply
+    return score
+
+def scoreFromTable(score, ply):
+    if isMateScore(score):
+        return score - ply if score > 0 else score + ply
+    return score
+
+# negamax alpha-beta with iterative deepening, principal variation search and aspiration windows.
+# the search stops at whichever of maxDepth, maxNodes or maxTime (seconds) is reached first.
+# orderMoves=False only searches the TT/PV move first, for comparing node counts.
+# startDepth lets parallel helpers skip the first iterations and diverge from the main search
+class Searcher:
+    def __init__(self, chessBoard, maxDepth=maxSearchDepth, maxNodes=None, maxTime=None, onIteration=None, orderMoves=True, startDepth=1):
+        self.board = chessBoard
+        self.maxDepth = min(maxDepth, maxSearchDepth)
+        self.startDepth = max(1, min(startDepth, self.maxDepth))
+        self.maxNodes = maxNodes
+        self.maxTime = maxTime
+        self.onIteration = onIteration
+        self.transpositionTable = chessBoard.transpositionTable
+        self.tablebases = chessBoard.tablebases
+        self.orderMoves = orderMoves
+        self.moveOrderer = moveOrdering.MoveOrderer(maxSearchDepth + 1)
+        self.nodes = 0
+        self.qnodes = 0
+        self.tablebaseHits = 0
+        self.stopped = False
+        self.deadline = None
+        self.startTime = 0
+        self.rootMoves = []
+        self.previousPrincipalVariation = []
+        # triangular principal variation table, pvTable[ply] holds the best line from that ply
+        self.pvTable = [[moveEncoding.noMove] * (maxSearchDepth + 1) for _ in range(maxSearchDepth + 1)]
+        self.pvLength = [0] * (maxSearchDepth + 1)
+
+    def stop(self):
+        self.stopped = True
+
+    # can be called from another thread while searching, the limit counts from when the search started
+    def setTimeLimit(self, maxTime):
+        self.maxTime = maxTime
+        self.deadline = self.startTime + maxTime if maxTime is not None else None
+
+    def checkLimits(self):
+        totalNodes = self.nodes + self.qnodes
+        if self.maxNodes is not None and totalNodes >= self.maxNodes:
+            self.stopped = True
+        elif self.deadline is not None and totalNodes % nodesBetweenTimeChecks == 0 and time.perf_counter() >= self.deadline:
+            self.stopped = True
+
+    def search(self):
+        self.startTime = time.perf_counter()
+        self.deadline = self.startTime + self.maxTime if self.maxTime is not None else None
+        self.nodes = 0
+        self.qnodes = 0
+        self.tablebaseHits = 0
+        self.stopped = False
+        if self.transpositionTable is not None:
+            self.transpositionTable.newSearch()
+
+        nRootMoves = self.board.generateLegalMoves(1)
+        if self.orderMoves:
+            self.moveOrderer.orderMoves(self.board, self.board.moveBuffers[1], nRootMoves, 0)
+        self.rootMoves = self.board.moveBuffers[1][:nRootMoves].tolist()
+        if not self.rootMoves:
+            score = -mateScore if self.board.checkers else 0
+            return SearchResult(moveEncoding.noMove, score, 0, 0, 0.0, [])
+        if self.tablebases is not None and (tablebaseResult := self.tablebaseRootResult()) is not None:
+            return tablebaseResult
+
+        result = SearchResult(self.rootMoves[0], 0, 0, 0, 0.0, [self.rootMoves[0]])
+        for depth in range(self.startDepth, self.maxDepth + 1):
+            score = self.aspirationSearch(depth, result.score)
+            if self.stopped:    # an unfinished iteration can't be trusted, keep the last complete one
+                break
+
+            principalVariation = self.pvTable[0][:self.pvLength[0]]
+            result = SearchResult(principalVariation[0], score, depth, self.nodes, time.perf_counter() - self.startTime, principalVariation,
+                                  qnodes=self.qnodes, tablebaseHits=self.tablebaseHits)
+            self.addTableStatistics(result)
+            self.previousPrincipalVariation = principalVariation
+            self.rootMoves.remove(result.bestMove)
+            self.rootMoves.insert(0, result.bestMove)
+            if self.onIteration is not None:
+                self.onIteration(result)
+            if isMateScore(score) or len(self.rootMoves) == 1:
+                break
+
+        result.nodes = self.nodes
+        result.qnodes = self.qnodes
+        result.tablebaseHits = self.tablebaseHits
+        result.elapsed = time.perf_counter() - self.startTime
+        self.addTableStatistics(result)
+        return result
+
+    # a root position the tablebases hold needs no search, the tables give the fastest mate and its exact score
+    def tablebaseRootResult(self):
+        best = self.tablebases.bestMove(self.board)
+        if best is None:
+            return None
+        bestMove, value = best
+        plies = tablebase.distancePlies(value)
+        score = mateScore - plies if value > 0 else -mateScore + plies if value < 0 else 0
+        self.tablebaseHits = 1
+        result = SearchResult(bestMove, score, 1, 0, time.perf_counter() - self.startTime, self.tablebases.principalVariation(self.board) or [bestMove],
+                              tablebaseHits=self.tablebaseHits)
+        if self.onIteration is not None:
+            self.onIteration(result)
+        return result
+
+    # win, draw or loss from the tablebases once few enough pieces are left, scored by ply so nearer wins are preferred
+    def probeTablebases(self, ply):
+        if int(self.board.bitboards[bitboards.allPieces]).bit_count() > self.tablebases.maxPieces:
+            return None
+        wdl = self.tablebases.probeWdl(self.board)
+        if wdl is None:
+            return None
+        self.tablebaseHits += 1
+        if wdl == tablebase.win:
+            return tablebaseWinScore - ply
+        if wdl == tablebase.loss:
+            return -tablebaseWinScore + ply
+        return 0
+
+    def addTableStatistics(self, result):
+        if self.transpositionTable is not None:
+            result.hashFull = self.transpositionTable.fillRate()
+            result.ttHitRate = self.transpositionTable.hitRate()
+
+    def aspirationSearch(self, depth, previousScore):
+        if depth < 3 or isMateScore(previousScore):
+            return self.searchRoot(depth, -infinity, infinity)
+
+        delta = aspirationWindow
+        alpha, beta = previousScore - delta, previousScore + delta
+        while True:
+            score = self.searchRoot(depth, alpha, beta)
+            if self.stopped:
+                return score
+            if score <= alpha:
+                alpha = max(score - delta, -infinity)
+            elif score >= beta:
+                beta = min(score + delta, infinity)
+            else:
+                return score
+            delta *= 2
+
+    def searchRoot(self, depth, alpha, beta):
+        bestScore = -infinity
+        for moveIndex, rootMove in enumerate(self.rootMoves):
+            self.board.makeMove(rootMove)
+            score = self.principalVariationSearch(moveIndex, depth, alpha, beta, 1, rootMove == self.principalVariationMove(0))
+            self.board.unmakeMove()
+            if self.stopped:
+                return bestScore
+
+            if score > bestScore:
+                bestScore = score
+                self.updatePrincipalVariation(0, rootMove)
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return bestScore
+
+    # the first move gets the full window, the rest are expected to fail low and only get re-searched if they don't.
+    # onPrincipalVariation says every move so far followed the previous iteration's principal variation
+    def principalVariationSearch(self, moveIndex, depth, alpha, beta, ply, onPrincipalVariation=False):
+        if moveIndex == 0:
+            return -self.negamax(depth-1, -beta, -alpha, ply, onPrincipalVariation)
+        score = -self.negamax(depth-1, -alpha-1, -alpha, ply, onPrincipalVariation)
+        if alpha < score < beta:
+            score = -self.negamax(depth-1, -beta, -alpha, ply, onPrincipalVariation)
+        return score
+
+    def negamax(self, depth, alpha, beta, ply, onPrincipalVariation=False):
+        if depth <= 0:
+            return self.quiescence(alpha, beta, ply)
+        self.pvLength[ply] = ply
+        self.nodes += 1
+        self.checkLimits()
+        if self.stopped:
+            return 0
+        if self.board.isFiftyMoveDraw() or self.board.isRepetition():
+            return 0
+        if self.tablebases is not None and (tablebaseScore := self.probeTablebases(ply)) is not None:
+            return tablebaseScore
+
+        table = self.transpositionTable
+        hashMove = moveEncoding.noMove
+        if table is not None:
+            entry = table.probe(self.board.hashKey)
+            if entry is not None:
+                entryDepth, entryScore, bound, hashMove = entry
+                entryScore = scoreFromTable(entryScore, ply)
+                # only null window nodes take the cutoff, so the principal variation stays whole
+                if entryDepth >= depth and beta - alpha == 1 and (bound == transpositionTable.exactBound or
+                        (bound == transpositionTable.lowerBound and entryScore >= beta) or
+                        (bound == transpositionTable.upperBound and entryScore <= alpha)):
+                    return entryScore
+
+        # the previous principal variation's move only belongs to this position while the line still follows it
+        principalVariationMove = self.principalVariationMove(ply) if onPrincipalVariation else moveEncoding.noMove
+        hashMove = principalVariationMove or hashMove
+        if self.orderMoves:
+            moves = self.moveOrderer.stagedMoves(self.board, ply, hashMove)
+        else:
+            nMoves = self.board.generateLegalMoves(ply+1)
+            moveBuffer = self.board.moveBuffers[ply+1]
+            self.orderMoveFirst(moveBuffer, nMoves, hashMove)
+            moves = moveBuffer[:nMoves]
+
+        originalAlpha = alpha
+        bestScore = -infinity
+        bestMove = moveEncoding.noMove
+        for moveIndex, currentMove in enumerate(moves):
+            self.board.makeMove(currentMove)
+            score = self.principalVariationSearch(moveIndex, depth, alpha, beta, ply+1,
+                                                  principalVariationMove != moveEncoding.noMove and currentMove == principalVariationMove)
+            self.board.unmakeMove()
+            if self.stopped:
+                return 0
+
+            if score > bestScore:
+                bestScore = score
+                if score > alpha:
+                    alpha = score
+                    bestMove = currentMove
+                    self.updatePrincipalVariation(ply, currentMove)
+                    if alpha >= beta:
+                        if self.orderMoves:
+                            self.moveOrderer.updateForCutoff(self.board, currentMove, depth, ply)
+                        break
+
+        if bestScore == -infinity:  # no legal moves, the last generation was for this position so checkers is current
+            return -mateScore + ply if self.board.checkers else 0
+        if table is not None:
+            if bestScore >= beta:
+                bound = transpositionTable.lowerBound
+            elif bestScore > originalAlpha:
+                bound = transpositionTable.exactBound
+            else:
+                bound = transpositionTable.upperBound
+            table.store(self.board.hashKey, depth, scoreToTable(bestScore, ply), bound, bestMove)
+        return bestScore
+
+    # plays out captures at the leaves so the evaluation isn't taken in the middle of an exchange.
+    # the side to move can stand pat on the static evaluation instead of capturing, captures that
+    # can't bring the score back up to alpha (delta pruning) or lose material (SEE) are skipped
+    def quiescence(self, alpha, beta, ply):
+        self.pvLength[ply] = ply
+        self.qnodes += 1
+        self.checkLimits()
+        if self.stopped:
+            return 0
+        if self.board.isFiftyMoveDraw() or self.board.isRepetition():
+            return 0
+        standPat = evaluation.evaluate(self.board)
+        if standPat >= beta or ply >= maxSearchDepth:
+            return standPat
+        alpha = max(alpha, standPat)
+
+        bestScore = standPat
+        for currentMove in self.moveOrderer.stagedMoves(self.board, ply, capturesOnly=True):
+            capturedValue = staticExchange.pieceValue(piece.pieceToPieceType(moveEncoding.capturedPiece(currentMove)))
+            promotionPieceType = moveEncoding.promotionPieceType(currentMove)
+            if not promotionPieceType and standPat + capturedValue + deltaMargin <= alpha:
+                continue
+            if staticExchange.staticExchangeEvaluation(self.board, currentMove) < 0:
+                continue
+
+            self.board.makeMove(currentMove)
+            score = -self.quiescence(-beta, -alpha, ply+1)
+            self.board.unmakeMove()
+            if self.stopped:
+                return 0
+
+            if score > bestScore:
+                bestScore = score
+                if score > alpha:
+                    alpha = score
+                    self.updatePrincipalVariation(ply, currentMove)
+                    if alpha >= beta:
+                        break
+        return bestScore
+
+    def updatePrincipalVariation(self, ply, bestMove):
+        self.pvTable[ply][ply] = bestMove
+        childLength = self.pvLength[ply+1]
+        self.pvTable[ply][ply+1:childLength] = self.pvTable[ply+1][ply+1:childLength]
+        self.pvLength[ply] = max(childLength, ply+1)
+
+    # the previous iteration's move for this ply, searched before the table's move while the line follows that
+    # iteration's principal variation. it is still checked against the legal moves when ordering
+    def principalVariationMove(self, ply):
+        if ply >= len(self.previousPrincipalVariation):
+            return moveEncoding.noMove
+        return self.previousPrincipalVariation[ply]
+
+    def orderMoveFirst(self, moveBuffer, nMoves, firstMove):
+        if firstMove == moveEncoding.noMove:
+            return
+        for moveIndex in range(nMoves):
+            if moveBuffer[moveIndex] == firstMove:
+                moveBuffer[0], moveBuffer[moveIndex] = moveBuffer[moveIndex], moveBuffer[0]
+                return
+
+if __name__ == "__main__":
+    import gameBoard
+
+    parser = argparse.ArgumentParser(description='Search a position and report every completed iteration')
+    parser.add_argument('--fen', default=gameBoard.board.startingFen)
+    parser.add_argument('--depth', type=int, default=maxSearchDepth)
+    parser.add_argument('--nodes', type=int, default=None)
+    parser.add_argument('--time', type=float, default=None, help='seconds')
+    parser.add_argument('--hash', type=float, default=transpositionTable.defaultSizeMB, help='transposition table size in MB, 0 for none')
+    args = parser.parse_args()
+    if args.depth == maxSearchDepth and args.nodes is None and args.time is None:
+        args.depth = 4
+
+    chessBoard = gameBoard.board(False, args.fen)
+    chessBoard.transpositionTable = transpositionTable.TranspositionTable(args.hash) if args.hash > 0 else None
+    result = Searcher(chessBoard, args.depth, args.nodes, args.time, onIteration=print).search()
+    print(f"bestmove {moveEncoding.moveToString(result.bestMove)} nodes {result.nodes} qnodes {result.qnodes} nps {result.nodesPerSecond}")
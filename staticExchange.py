@@ -0,0 +1,53 @@
+import bitboards
+import evaluation
+import moveEncoding
+import piece
+
+# least valuable first, indexes into evaluation.pieceValues and the board's bitboards
+attackerOrder = [piece.pawn, piece.knight, piece.bishop, piece.rook, piece.queen, piece.king]
+
+def pieceValue(pieceType):
+    return evaluation.pieceValues[pieceType-1]
+
+# material won or lost in centipawns by the side making this capture if both sides keep recapturing
+# on the target square with their least valuable attacker and stop as soon as going on would lose.
+# attackers come from the board's attack sets, recomputed as pieces leave so x-rays behind them join in.
+# pins are ignored
+def staticExchangeEvaluation(chessBoard, encodedMove):
+    startSquare = moveEncoding.startSquare(encodedMove)
+    targetSquare = moveEncoding.endSquare(encodedMove)
+    capturedPiece = moveEncoding.capturedPiece(encodedMove)
+    moverIsWhite = piece.isWhite(chessBoard.board[startSquare])
+    pieceBitboards = chessBoard.bitboards.tolist()
+
+    occupancy = chessBoard.occupancy() & ~bitboards.squareBit(startSquare)
+    if moveEncoding.isEnPassant(encodedMove):
+        occupancy &= ~bitboards.squareBit(moveEncoding.capturedPieceSquare(encodedMove))
+    gains = [pieceValue(piece.pieceToPieceType(capturedPiece))]
+    valueOnSquare = pieceValue(piece.pieceToPieceType(chessBoard.board[startSquare]))
+    if promotionPieceType := moveEncoding.promotionPieceType(encodedMove):
+        gains[0] += pieceValue(promotionPieceType) - pieceValue(piece.pawn)
+        valueOnSquare = pieceValue(promotionPieceType)
+
+    sideIsWhite = not moverIsWhite
+    while True:
+        attackers = chessBoard.attackersOfSquare(targetSquare, sideIsWhite, occupancy) & occupancy
+        if attackers == 0:
+            break
+        offset = 0 if sideIsWhite else 6
+        for attackerType in attackerOrder:
+            attackerSet = attackers & pieceBitboards[offset + attackerType-1]
+            if attackerSet:
+                break
+        # the king can only take last
+        if attackerType == piece.king and chessBoard.attackersOfSquare(targetSquare, not sideIsWhite, occupancy) & occupancy:
+            break
+        gains.append(valueOnSquare - gains[-1])
+        valueOnSquare = pieceValue(attackerType)
+        occupancy &= ~(attackerSet & -attackerSet)
+        sideIsWhite = not sideIsWhite
+
+    # either side may stop capturing, work back from the end of the sequence
+    for i in range(len(gains)-1, 0, -1):
+        gains[i-1] = -max(-gains[i-1], gains[i])
+    return gains[0]
@@ -0,0 +1,539 @@
+import argparse
+import concurrent.futures
+import itertools
+import mmap
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+import moveEncoding
+import piece
+
+# endgame tablebases for positions with up to maxPieces pieces (kings included), made by retrograde analysis
+# over the engine's own move generator. every material balance ("signature", e.g. KRvK, strongest side as
+# white) gets two files of one entry per position:
+#   .dtm  a signed byte, moves to mate from the side to move's point of view (see encodeDistance), 0 for a draw
+#   .wdl  2 bits, draw/win/loss for the side to move, packed four to a byte so search probes stay in cache
+# positions are indexed by side to move and piece squares, with the white king folded onto 10 squares by the
+# board's 8 symmetries (only the left-right mirror with pawns, leaving 32). the files are memory mapped when
+# first probed. castling rights are never in a table. an index has no en passant square either: a double push that
+# lets the opponent capture en passant leads, during generation, to an extra node offering the position's replies
+# plus that capture, and a position where en passant is possible is probed through its moves
+
+maxPieces = 4
+defaultDirectory = 'tablebases'
+draw, win, loss = 0, 1, 2   # wdl codes
+pieceSymbols = 'KQRBNP'     # order of the pieces in a signature and in an index
+symbolPieceTypes = {'K': piece.king, 'Q': piece.queen, 'R': piece.rook, 'B': piece.bishop, 'N': piece.knight, 'P': piece.pawn}
+unresolved = np.iinfo(np.int16).max
+chunkSize = 4096    # positions per generator job
+
+# moves to mate as stored in a .dtm byte: k > 0 mates in k moves (2k-1 plies), k < 0 is mated in -k-1 moves (2(-k-1) plies)
+def encodeDistance(plies):
+    return (plies + 1) // 2 if plies % 2 else -(plies // 2) - 1
+
+def distancePlies(value):
+    return 2 * value - 1 if value > 0 else 2 * (-value - 1)
+
+# the value of a position from the value of the position after a move, both from their side to move's point of view
+def parentValue(childValue):
+    if childValue < 0:
+        return -childValue
+    if childValue > 0:
+        return -childValue - 1
+    return 0
+
+# orders values from the side to move's point of view: fastest win, then draw, then slowest loss
+def valueRank(value):
+    return (2, -value) if value > 0 else (1, 0) if value == 0 else (0, -value)
+
+def sideValue(side):
+    return sum(piece.values[symbolPieceTypes[symbol]] for symbol in side)
+
+# the signature with the stronger side as white, and whether the board's colors have to be swapped to match it
+def canonicalSignature(whiteSide, blackSide):
+    if (sideValue(whiteSide), whiteSide) < (sideValue(blackSide), blackSide):
+        return f"{blackSide}v{whiteSide}", True
+    return f"{whiteSide}v{blackSide}", False
+
+# every signature with at most nPieces pieces, fewest pieces first
+def allSignatures(nPieces):
+    signatures = []
+    for nExtra in range(nPieces - 1):
+        for extraPieces in itertools.combinations_with_replacement(pieceSymbols[1:], nExtra):
+            for nWhite in range(nExtra + 1):
+                for whiteExtras in set(itertools.combinations(extraPieces, nWhite)):
+                    blackExtras = list(extraPieces)
+                    for symbol in whiteExtras:
+                        blackExtras.remove(symbol)
+                    signature, _ = canonicalSignature('K' + ''.join(whiteExtras), 'K' + ''.join(blackExtras))
+                    if signature not in signatures:
+                        signatures.append(signature)
+    return signatures
+
+# signatures a move can lead to: a capture removes a piece, a promotion turns a pawn into another piece
+def dependencies(signature):
+    whiteSide, blackSide = signature.split('v')
+    sides = []
+    for side, otherSide, isWhite in ((whiteSide, blackSide, True), (blackSide, whiteSide, False)):
+        for i, symbol in enumerate(side[1:], 1):
+            sides.append((side[:i] + side[i+1:], otherSide, isWhite))
+            if symbol == 'P':
+                for promotionSymbol in 'QRBN':
+                    sides.append((''.join(sorted(side[:i] + promotionSymbol + side[i+1:], key=pieceSymbols.index)), otherSide, isWhite))
+    return sorted({canonicalSignature(*((side, otherSide) if isWhite else (otherSide, side)))[0] for side, otherSide, isWhite in sides})
+
+def squareFileRow(squareIndex):
+    return squareIndex % 8, 7 - squareIndex // 8
+
+def fileRowSquare(file, row):
+    return (7 - row) * 8 + file
+
+# the board's 8 symmetries as square -> square tables, the first is the identity and the second the left-right mirror
+def buildSymmetries():
+    symmetries = []
+    for swapFileRow, mirrorRow, mirrorFile in itertools.product((False, True), repeat=3):
+        symmetry = []
+        for squareIndex in range(64):
+            file, row = squareFileRow(squareIndex)
+            if swapFileRow:
+                file, row = row, file
+            if mirrorRow:
+                row = 7 - row
+            if mirrorFile:
+                file = 7 - file
+            symmetry.append(fileRowSquare(file, row))
+        symmetries.append(symmetry)
+    return symmetries
+
+symmetries = buildSymmetries()
+
+# where a table's positions go in its files
+class TableLayout:
+    def __init__(self, signature):
+        self.signature = signature
+        whiteSide, blackSide = signature.split('v')
+        self.pieces = ([piece.white | piece.king, piece.black | piece.king] +
+                       [piece.white | symbolPieceTypes[symbol] for symbol in whiteSide[1:]] +
+                       [piece.black | symbolPieceTypes[symbol] for symbol in blackSide[1:]])
+        self.hasPawns = 'P' in signature
+        if self.hasPawns:
+            self.kingSquares = [squareIndex for squareIndex in range(64) if squareFileRow(squareIndex)[0] <= 3]
+            allowedSymmetries = symmetries[:2]
+        else:
+            self.kingSquares = [squareIndex for squareIndex in range(64) if squareFileRow(squareIndex)[1] <= squareFileRow(squareIndex)[0] <= 3]
+            allowedSymmetries = symmetries
+        self.kingIndex = {squareIndex: i for i, squareIndex in enumerate(self.kingSquares)}
+        # the first symmetry taking the white king from each square onto one of kingSquares
+        self.kingSymmetry = [next(symmetry for symmetry in allowedSymmetries if symmetry[squareIndex] in self.kingIndex) for squareIndex in range(64)]
+        self.positionsPerSide = len(self.kingSquares) * 64 ** (len(self.pieces) - 1)
+        self.nPositions = 2 * self.positionsPerSide
+
+    # squares are given in the order of self.pieces
+    def index(self, whiteToMove, squares):
+        symmetry = self.kingSymmetry[squares[0]]
+        index = (0 if whiteToMove else len(self.kingSquares)) + self.kingIndex[symmetry[squares[0]]]
+        for squareIndex in squares[1:]:
+            index = index * 64 + symmetry[squareIndex]
+        return index
+
+    def position(self, index):
+        squares = []
+        for _ in range(len(self.pieces) - 1):
+            index, squareIndex = divmod(index, 64)
+            squares.append(squareIndex)
+        whiteToMove = index < len(self.kingSquares)
+        squares.append(self.kingSquares[index % len(self.kingSquares)])
+        return whiteToMove, squares[::-1]
+
+    # pieces on different squares and no pawns on the first or last rank
+    def isPlacementValid(self, squares):
+        if len(set(squares)) != len(squares):
+            return False
+        return all(piece.pieceToPieceType(pieceOnSquare) != piece.pawn or 8 <= squareIndex < 56
+                   for pieceOnSquare, squareIndex in zip(self.pieces, squares))
+
+    def fen(self, whiteToMove, squares):
+        placement = ['1'] * 64
+        for pieceOnSquare, squareIndex in zip(self.pieces, squares):
+            symbol = next(symbol for symbol, pieceType in symbolPieceTypes.items() if pieceType == piece.pieceToPieceType(pieceOnSquare))
+            placement[squareIndex] = symbol if piece.isWhite(pieceOnSquare) else symbol.lower()
+        ranks = [''.join(placement[rank*8:rank*8+8]) for rank in range(8)]
+        for nBlanks in range(8, 1, -1):
+            ranks = [rank.replace('1' * nBlanks, str(nBlanks)) for rank in ranks]
+        return f"{'/'.join(ranks)} {'w' if whiteToMove else 'b'} - - 0 1"
+
+# pieceLists indices of each side's pieces other than the king, in signature order
+signaturePieceLists = [(symbol, symbolPieceTypes[symbol] - 1) for symbol in pieceSymbols[1:]]
+
+def enPassantPossible(chessBoard):
+    if chessBoard.enPassantSquare < 0:
+        return False
+    ownPawn = (piece.white if chessBoard.whiteToMove else piece.black) | piece.pawn
+    return bool(chessBoard.attackersOfSquare(chessBoard.enPassantSquare, chessBoard.whiteToMove) & chessBoard.pieceBitboard(ownPawn))
+
+# (signature, whiteToMove, squares) of the board in its table's orientation, None for positions no table can hold
+def tablePosition(chessBoard, ignoreEnPassant=False):
+    if chessBoard.castlingRights.rights or (not ignoreEnPassant and enPassantPossible(chessBoard)):
+        return None
+    pieceLists = chessBoard.pieceLists
+    sides = []
+    for offset in (0, 6):
+        side, squares = 'K', []
+        for symbol, listIndex in signaturePieceLists:
+            side += symbol * len(pieceLists[offset + listIndex])
+            squares += pieceLists[offset + listIndex]
+        sides.append((side, pieceLists[offset][0], squares))
+    (whiteSide, whiteKing, whiteSquares), (blackSide, blackKing, blackSquares) = sides
+    signature, flipped = canonicalSignature(whiteSide, blackSide)
+    if flipped:
+        return signature, not chessBoard.whiteToMove, [squareIndex ^ 56 for squareIndex in [blackKing, whiteKing] + blackSquares + whiteSquares]
+    return signature, chessBoard.whiteToMove, [whiteKing, blackKing] + whiteSquares + blackSquares
+
+class Table:
+    def __init__(self, directory, signature):
+        self.layout = TableLayout(signature)
+        self.files = [open(os.path.join(directory, signature + extension), 'rb') for extension in ('.dtm', '.wdl')]
+        self.distances, self.wdl = [mmap.mmap(tableFile.fileno(), 0, access=mmap.ACCESS_READ) for tableFile in self.files]
+
+    def close(self):
+        self.distances.close()
+        self.wdl.close()
+        for tableFile in self.files:
+            tableFile.close()
+
+class Tablebases:
+    def __init__(self, directory=defaultDirectory):
+        self.directory = directory
+        self.available = {name[:-4] for name in os.listdir(directory) if name.endswith('.dtm')} if os.path.isdir(directory) else set()
+        self.maxPieces = max((len(signature) - 1 for signature in self.available), default=0)
+        self.tables = {}
+
+    def table(self, signature):
+        if signature not in self.tables:
+            self.tables[signature] = Table(self.directory, signature) if signature in self.available else None
+        return self.tables[signature]
+
+    def lookup(self, chessBoard, ignoreEnPassant=False):
+        position = tablePosition(chessBoard, ignoreEnPassant)
+        if position is None:
+            return None
+        signature, whiteToMove, squares = position
+        table = self.table(signature)
+        if table is None:
+            return None
+        return table, table.layout.index(whiteToMove, squares)
+
+    # moves to mate for the side to move, encoded like the .dtm files, None when no table holds the position
+    def probeDistance(self, chessBoard, ignoreEnPassant=False):
+        entry = self.lookup(chessBoard, ignoreEnPassant)
+        if entry is None:
+            if not ignoreEnPassant and enPassantPossible(chessBoard) and self.lookup(chessBoard, True) is not None:
+                return self.distanceFromMoves(chessBoard)
+            return None
+        table, index = entry
+        value = table.distances[index]
+        return value - 256 if value > 127 else value
+
+    # the best value the legal moves lead to, for positions the index can't hold because of their en passant square
+    def distanceFromMoves(self, chessBoard):
+        bestValue = None
+        for legalMove in [legalMove for pieceMoves in chessBoard.legalMoves.values() for legalMove in pieceMoves]:
+            chessBoard.makeMove(legalMove)
+            childValue = self.probeDistance(chessBoard)
+            chessBoard.unmakeMove()
+            if childValue is None:
+                return None
+            value = parentValue(childValue)
+            if bestValue is None or valueRank(value) > valueRank(bestValue):
+                bestValue = value
+        if bestValue is None:
+            return encodeDistance(0) if chessBoard.checkers else 0
+        return bestValue
+
+    # win, draw or loss for the side to move, None when no table holds the position
+    def probeWdl(self, chessBoard):
+        entry = self.lookup(chessBoard)
+        if entry is None:
+            value = self.probeDistance(chessBoard)
+            if value is None:
+                return None
+            return win if value > 0 else loss if value < 0 else draw
+        table, index = entry
+        return (table.wdl[index >> 2] >> 2 * (index & 3)) & 3
+
+    # the move that mates fastest (or loses slowest) and the position's distance value, None out of the tables
+    def bestMove(self, chessBoard):
+        if self.probeDistance(chessBoard) is None:
+            return None
+        bestMove, bestValue, bestRank = moveEncoding.noMove, 0, None
+        for pieceMoves in chessBoard.legalMoves.values():
+            for legalMove in pieceMoves:
+                chessBoard.makeMove(legalMove)
+                childValue = self.probeDistance(chessBoard)
+                chessBoard.unmakeMove()
+                if childValue is None:
+                    return None
+                value = parentValue(childValue)
+                rank = valueRank(value)
+                if bestRank is None or rank > bestRank:
+                    bestMove, bestValue, bestRank = legalMove, value, rank
+        return (bestMove, bestValue) if bestMove != moveEncoding.noMove else None
+
+    # the best line from the position until mate, or for maxPlies when it is drawn
+    def principalVariation(self, chessBoard, maxPlies=20):
+        line = []
+        while len(line) < maxPlies and (best := self.bestMove(chessBoard)) is not None:
+            line.append(best[0])
+            chessBoard.makeMove(best[0])
+        for _ in line:
+            chessBoard.unmakeMove()
+        return line
+
+openDirectories = {}    # directory -> Tablebases or None when it holds no tables, shared by every board
+
+def openTablebases(directory=defaultDirectory):
+    if directory not in openDirectories:
+        tablebases = Tablebases(directory)
+        openDirectories[directory] = tablebases if tablebases.available else None
+    return openDirectories[directory]
+
+workerBoard = None  # one board per generator process
+workerTablebases = None     # the smaller tables, a generator process only works on one table
+
+# the forward half of the generation, run over a range of a table's positions. every legal move either stays in
+# the table (an edge to the position it leads to) or leaves it through a capture or promotion, whose result comes
+# from a smaller table that is already on disk. returns per position: state (0 not a legal position, 1 has moves,
+# 2 checkmated, 3 stalemate), the fastest win (plies) and slowest loss any leaving move gives, whether a leaving
+# move draws, the number of edges, and the edges' target indices.
+# a double push the opponent can answer en passant is an edge to an extra node instead (target -1 for the
+# chunk's first, -2 for its second ...), for which the position the push leads to, and the fastest win, slowest
+# loss and draw of the en passant captures, are returned as well
+def forwardPass(signature, directory, start, stop):
+    global workerBoard, workerTablebases
+    import gameBoard    # gameBoard imports this module
+
+    if workerBoard is None:
+        workerBoard = gameBoard.board(False)
+        workerBoard.transpositionTable = None
+        workerTablebases = Tablebases(directory)
+    chessBoard = workerBoard
+    tablebases = workerTablebases
+    layout = TableLayout(signature)
+
+    n = stop - start
+    states = np.zeros(n, dtype=np.uint8)
+    winPlies = np.full(n, unresolved, dtype=np.int16)
+    lossPlies = np.zeros(n, dtype=np.int16)
+    canDraw = np.zeros(n, dtype=bool)
+    edgeCounts = np.zeros(n, dtype=np.uint8)
+    edgeTargets = []
+    enPassantNodes = []     # (position the push leads to, win plies, loss plies, can draw)
+
+    for i, index in enumerate(range(start, stop)):
+        whiteToMove, squares = layout.position(index)
+        if not layout.isPlacementValid(squares):
+            continue
+        try:
+            chessBoard.initBoard(layout.fen(whiteToMove, squares))
+        except ValueError:  # the side not to move is in check
+            continue
+
+        nMoves = chessBoard.generateLegalMoves(1)
+        if nMoves == 0:
+            states[i] = 2 if chessBoard.checkers else 3
+            continue
+        states[i] = 1
+        pieceOnSquare = {squareIndex: pieceIndex for pieceIndex, squareIndex in enumerate(squares)}
+        for legalMove in chessBoard.moveBuffers[1][:nMoves].tolist():
+            # a quiet move stays in the table, the position it leads to only needs the moved piece's new square
+            if moveEncoding.capturedPiece(legalMove) == piece.none and not moveEncoding.promotionPieceType(legalMove):
+                childSquares = squares.copy()
+                childSquares[pieceOnSquare[moveEncoding.startSquare(legalMove)]] = moveEncoding.endSquare(legalMove)
+                childIndex = layout.index(not whiteToMove, childSquares)
+                if moveEncoding.isDoublePawnPush(legalMove) and (enPassantNode := enPassantReplies(chessBoard, tablebases, legalMove, childIndex)):
+                    enPassantNodes.append(enPassantNode)
+                    childIndex = -len(enPassantNodes)
+                edgeTargets.append(childIndex)
+                edgeCounts[i] += 1
+                continue
+
+            chessBoard.makeMove(legalMove)
+            value = parentValue(tablebases.probeDistance(chessBoard, ignoreEnPassant=True))
+            chessBoard.unmakeMove()
+            if value > 0:
+                winPlies[i] = min(winPlies[i], distancePlies(value))
+            elif value < 0:
+                lossPlies[i] = max(lossPlies[i], distancePlies(value))
+            else:
+                canDraw[i] = True
+    return start, states, winPlies, lossPlies, canDraw, edgeCounts, np.array(edgeTargets, dtype=np.int32), enPassantNodes
+
+# the extra node of a double push that can be captured en passant, None when no en passant capture is legal
+def enPassantReplies(chessBoard, tablebases, doublePush, childIndex):
+    chessBoard.makeMove(doublePush)
+    nReplies = chessBoard.generateLegalMoves(2)
+    winPlies, lossPlies, canDraw, nCaptures = unresolved, 0, False, 0
+    for reply in chessBoard.moveBuffers[2][:nReplies].tolist():
+        if not moveEncoding.isEnPassant(reply):
+            continue
+        nCaptures += 1
+        chessBoard.makeMove(reply)
+        value = parentValue(tablebases.probeDistance(chessBoard, ignoreEnPassant=True))
+        chessBoard.unmakeMove()
+        if value > 0:
+            winPlies = min(winPlies, distancePlies(value))
+        elif value < 0:
+            lossPlies = max(lossPlies, distancePlies(value))
+        else:
+            canDraw = True
+    chessBoard.unmakeMove()
+    return (childIndex, winPlies, lossPlies, canDraw) if nCaptures else None
+
+# appends the extra en passant nodes after a table's positions: each has the moves of the position its push led to,
+# with the en passant captures added to its leaving moves. edge targets are renumbered from the chunk-local -1, -2 ...
+def addEnPassantNodes(n, states, winPlies, lossPlies, canDraw, edgeCounts, chunkTargets, chunkNodes):
+    nodeStart = n
+    for targets, nodes in zip(chunkTargets, chunkNodes):
+        local = targets < 0
+        targets[local] = nodeStart - 1 - targets[local]
+        nodeStart += len(nodes)
+    edgeTargets = np.concatenate(chunkTargets)
+    nodes = [node for nodes in chunkNodes for node in nodes]
+    if not nodes:
+        return states, winPlies, lossPlies, canDraw, edgeCounts, edgeTargets
+
+    children, nodeWins, nodeLosses, nodeDraws = (np.array(column) for column in zip(*nodes))
+    edgeStarts = np.concatenate(([0], np.cumsum(edgeCounts, dtype=np.int64)))
+    nodeTargets = [edgeTargets[edgeStarts[child]:edgeStarts[child + 1]] for child in children.tolist()]
+    return (np.concatenate((states, np.ones(len(nodes), dtype=np.uint8))),
+            np.concatenate((winPlies, np.minimum(winPlies[children], nodeWins).astype(np.int16))),
+            np.concatenate((lossPlies, np.maximum(lossPlies[children], nodeLosses).astype(np.int16))),
+            np.concatenate((canDraw, canDraw[children] | nodeDraws.astype(bool))),
+            np.concatenate((edgeCounts, edgeCounts[children])),
+            np.concatenate([edgeTargets] + nodeTargets))
+
+# the backward half: starting from the checkmates, a position is won in p+1 plies once any move reaches a
+# position lost in p plies, and lost in p+1 once every move reaches a won position, the slowest in p plies.
+# returns each position's distance value
+def retrogradeAnalysis(nPositions, states, winPlies, lossPlies, canDraw, edgeCounts, edgeTargets):
+    edgeSources = np.repeat(np.arange(nPositions, dtype=np.int32), edgeCounts)
+    order = np.argsort(edgeTargets, kind='stable')
+    predecessors = edgeSources[order]
+    del edgeSources
+    predecessorStarts = np.zeros(nPositions + 1, dtype=np.int64)
+    np.cumsum(np.bincount(edgeTargets, minlength=nPositions), out=predecessorStarts[1:])
+    del order
+
+    def predecessorsOf(positions):
+        starts, ends = predecessorStarts[positions], predecessorStarts[positions + 1]
+        counts = ends - starts
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return predecessors[offsets]
+
+    remainingMoves = edgeCounts.astype(np.int32)
+    cannotLose = canDraw | (winPlies != unresolved)
+    pendingLoss = np.full(nPositions, unresolved, dtype=np.int16)
+    pendingLoss[states == 2] = 0
+    # every move leaves the table and none of them avoids losing
+    leavesLost = (states == 1) & (remainingMoves == 0) & ~cannotLose
+    pendingLoss[leavesLost] = lossPlies[leavesLost]
+    resolvedPlies = np.full(nPositions, -1, dtype=np.int16)
+
+    plies = 0
+    lastPending = max(int(winPlies[winPlies != unresolved].max(initial=0)), int(pendingLoss[pendingLoss != unresolved].max(initial=0)))
+    while plies <= lastPending:
+        openPositions = resolvedPlies < 0
+        if plies % 2:
+            newlyWon = np.flatnonzero(openPositions & (winPlies == plies))
+            resolvedPlies[newlyWon] = plies
+            parents, moveCounts = np.unique(predecessorsOf(newlyWon), return_counts=True)
+            remainingMoves[parents] -= moveCounts
+            nowLost = parents[(remainingMoves[parents] == 0) & ~cannotLose[parents] & (resolvedPlies[parents] < 0)]
+            pendingLoss[nowLost] = np.maximum(lossPlies[nowLost], plies + 1)
+            if len(nowLost):
+                lastPending = max(lastPending, int(pendingLoss[nowLost].max()))
+        else:
+            newlyLost = np.flatnonzero(openPositions & (pendingLoss == plies))
+            resolvedPlies[newlyLost] = plies
+            parents = predecessorsOf(newlyLost)
+            winPlies[parents] = np.minimum(winPlies[parents], plies + 1)
+            cannotLose[parents] = True
+            if len(parents):
+                lastPending = max(lastPending, plies + 1)
+        plies += 1
+
+    distances = np.zeros(nPositions, dtype=np.int8)
+    won, lost = (resolvedPlies >= 0) & (resolvedPlies % 2 == 1), (resolvedPlies >= 0) & (resolvedPlies % 2 == 0)
+    distances[won] = (resolvedPlies[won] + 1) // 2
+    distances[lost] = -(resolvedPlies[lost] // 2) - 1
+    return distances
+
+def writeTable(directory, signature, distances):
+    wdl = np.where(distances > 0, win, np.where(distances < 0, loss, draw)).astype(np.uint8)
+    wdl = np.pad(wdl, (0, -len(wdl) % 4)).reshape(-1, 4)
+    packed = (wdl[:, 0] | wdl[:, 1] << 2 | wdl[:, 2] << 4 | wdl[:, 3] << 6).astype(np.uint8)
+    distances.tofile(os.path.join(directory, signature + '.dtm'))
+    packed.tofile(os.path.join(directory, signature + '.wdl'))
+
+# builds the table and, first, every table its captures and promotions lead to
+def generateTable(signature, directory=defaultDirectory, nWorkers=1, log=print):
+    for dependency in dependencies(signature):
+        if not os.path.isfile(os.path.join(directory, dependency + '.dtm')):
+            generateTable(dependency, directory, nWorkers, log)
+    os.makedirs(directory, exist_ok=True)
+    startTime = time.perf_counter()
+    layout = TableLayout(signature)
+    n = layout.nPositions
+
+    states = np.zeros(n, dtype=np.uint8)
+    winPlies = np.zeros(n, dtype=np.int16)
+    lossPlies = np.zeros(n, dtype=np.int16)
+    canDraw = np.zeros(n, dtype=bool)
+    edgeCounts = np.zeros(n, dtype=np.uint8)
+    nChunks = (n + chunkSize - 1) // chunkSize
+    edgeTargets, enPassantNodes = [None] * nChunks, [None] * nChunks
+    with concurrent.futures.ProcessPoolExecutor(nWorkers) as executor:
+        jobs = [executor.submit(forwardPass, signature, directory, start, min(start + chunkSize, n)) for start in range(0, n, chunkSize)]
+        for job in concurrent.futures.as_completed(jobs):
+            start, *chunk, chunkTargets, chunkNodes = job.result()
+            stop = start + len(chunk[0])
+            states[start:stop], winPlies[start:stop], lossPlies[start:stop], canDraw[start:stop], edgeCounts[start:stop] = chunk
+            edgeTargets[start // chunkSize], enPassantNodes[start // chunkSize] = chunkTargets, chunkNodes
+    forwardTime = time.perf_counter() - startTime
+
+    graph = addEnPassantNodes(n, states, winPlies, lossPlies, canDraw, edgeCounts, edgeTargets, enPassantNodes)
+    distances = retrogradeAnalysis(len(graph[0]), *graph)[:n]
+    writeTable(directory, signature, distances)
+    nLegal = int(np.count_nonzero(states))
+    log(f"{signature:<8} {n:>9} positions ({nLegal} legal), won {np.count_nonzero(distances > 0) / nLegal:.1%} "
+        f"lost {np.count_nonzero(distances < 0) / nLegal:.1%}, longest mate {distances.max()} moves, "
+        f"{forwardTime:.1f}s moves + {time.perf_counter() - startTime - forwardTime:.1f}s retrograde")
+
+if __name__ == "__main__":
+    import gameBoard
+
+    parser = argparse.ArgumentParser(description='Generate endgame tablebases, or probe a position')
+    parser.add_argument('--generate', nargs='*', metavar='SIGNATURE', help='e.g. KQvK KRvKB, or nothing for every table up to --pieces')
+    parser.add_argument('--pieces', type=int, default=3, choices=range(2, maxPieces + 1))
+    parser.add_argument('--directory', default=defaultDirectory)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--fen', help='position to probe')
+    args = parser.parse_args()
+
+    if args.generate is not None:
+        for signature in args.generate or allSignatures(args.pieces):
+            if not os.path.isfile(os.path.join(args.directory, signature + '.dtm')):
+                generateTable(canonicalSignature(*signature.split('v'))[0], args.directory, args.workers)
+    if args.fen:
+        chessBoard = gameBoard.board(False, args.fen)
+        tablebases = Tablebases(args.directory)
+        value = tablebases.probeDistance(chessBoard)
+        if value is None:
+            print("not in the tablebases")
+        else:
+            outcome = f"mate in {value}" if value > 0 else f"mated in {-value-1}" if value < 0 else "draw"
+            pv = ' '.join(moveEncoding.moveToString(pvMove) for pvMove in tablebases.principalVariation(chessBoard))
+            print(f"{outcome} ({['draw', 'win', 'loss'][tablebases.probeWdl(chessBoard)]} for the side to move)  pv {pv}")
@@ -0,0 +1,144 @@
+import argparse
+import weakref
+from multiprocessing import shared_memory
+
+import moveEncoding
+import numpy as np
+
+defaultSizeMB = 16
+
+noBound = 0     # empty slot
+exactBound = 1
+lowerBound = 2  # failed high, the score is at least this
+upperBound = 3  # failed low, the score is at most this
+
+entryType = np.dtype([
+    ('key', np.uint64),
+    ('bestMove', np.uint32),
+    ('score', np.int32),
+    ('depth', np.uint8),
+    ('bound', np.uint8),
+    ('age', np.uint8),
+])
+slotsPerBucket = 2  # slot 0 keeps the deepest result, slot 1 is always replaced
+depthPreferredSlot = 0
+alwaysReplaceSlot = 1
+fillRateSampleBuckets = 1000
+
+# the stored key is the position's key xored with this, so an entry torn by two processes writing it
+# at once no longer matches its position and reads as a miss
+def entrySignature(bestMove, score, depth, bound):
+    return bestMove ^ ((score & 0xffffffff) << 23) ^ (depth << 55) ^ (bound << 62)
+
+# fixed-size hash table preallocated as a numpy structured array of (key, best move, score, depth, bound, age).
+# a bucket's depth-preferred slot is only overwritten by deeper or newer results, everything else goes to the
+# always-replace slot, so deep entries survive while shallow ones still get cached.
+# shared=True places the entries in shared memory, other processes attach to it with sharedName
+class TranspositionTable:
+    def __init__(self, sizeInMB=defaultSizeMB, shared=False, sharedName=None):
+        bucketBytes = entryType.itemsize * slotsPerBucket
+        nBuckets = max(1, (int(sizeInMB * 1024 * 1024) // bucketBytes))
+        self.nBuckets = 1 << (nBuckets.bit_length() - 1)    # power of two, indexed by masking the key
+        self.bucketMask = self.nBuckets - 1
+        self.sizeInMB = sizeInMB
+        self.sharedMemory = None
+        if shared or sharedName is not None:
+            nBytes = self.nBuckets * bucketBytes
+            self.sharedMemory = shared_memory.SharedMemory(name=sharedName, create=sharedName is None, size=nBytes)
+            self.entries = np.ndarray((self.nBuckets, slotsPerBucket), dtype=entryType, buffer=self.sharedMemory.buf)
+            if sharedName is None:
+                self.entries[:] = 0
+                weakref.finalize(self, TranspositionTable.releaseSharedMemory, self.sharedMemory)
+        else:
+            self.entries = np.zeros((self.nBuckets, slotsPerBucket), dtype=entryType)
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    @property
+    def sizeInBytes(self):
+        return self.entries.nbytes
+
+    @property
+    def sharedName(self):
+        return self.sharedMemory.name if self.sharedMemory is not None else None
+
+    # only the process that created the shared memory removes it
+    def releaseSharedMemory(sharedMemory):
+        sharedMemory.close()
+        sharedMemory.unlink()
+
+    def clear(self):
+        self.entries[:] = 0
+        self.age = 0
+        self.resetStatistics()
+
+    def resetStatistics(self):
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    # called once per search, entries from earlier searches become the first to be replaced
+    def newSearch(self):
+        self.age = (self.age + 1) & 0xff
+        self.resetStatistics()
+
+    # returns (depth, score, bound, bestMove) or None
+    def probe(self, hashKey):
+        self.probes += 1
+        for key, bestMove, score, depth, bound, age in self.entries[hashKey & self.bucketMask].tolist():
+            if bound != noBound and key ^ entrySignature(bestMove, score, depth, bound) == hashKey:
+                self.hits += 1
+                return depth, score, bound, bestMove
+        return None
+
+    def store(self, hashKey, depth, score, bound, bestMove):
+        self.stores += 1
+        bucketIndex = hashKey & self.bucketMask
+        bucket = self.entries[bucketIndex].tolist()
+        key, previousMove, previousScore, previousDepth, previousBound, previousAge = bucket[depthPreferredSlot]
+        samePosition = key ^ entrySignature(previousMove, previousScore, previousDepth, previousBound) == hashKey
+        if previousBound == noBound or samePosition or depth >= previousDepth or previousAge != self.age:
+            slot = depthPreferredSlot
+        else:
+            slot = alwaysReplaceSlot
+            key, previousMove, previousScore, previousDepth, previousBound = bucket[alwaysReplaceSlot][:5]
+            samePosition = key ^ entrySignature(previousMove, previousScore, previousDepth, previousBound) == hashKey
+        # a fail low doesn't know a best move, keep the one already found for this position
+        if bestMove == moveEncoding.noMove and samePosition:
+            bestMove = previousMove
+        depth = max(depth, 0)
+        self.entries[bucketIndex, slot] = (hashKey ^ entrySignature(bestMove, score, depth, bound), bestMove, score, depth, bound, self.age)
+
+    # per mille of sampled slots filled during the current search, like UCI's hashfull
+    def fillRate(self):
+        sample = self.entries[:fillRateSampleBuckets]
+        filled = np.count_nonzero((sample['bound'] != noBound) & (sample['age'] == self.age))
+        return filled * 1000 // sample.size
+
+    def hitRate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+if __name__ == "__main__":
+    import gameBoard
+    import search
+
+    parser = argparse.ArgumentParser(description='Search fixed depths with different table sizes to weigh memory against speedup')
+    parser.add_argument('--fen', action='append', help='may be given more than once, defaults to the start and kiwipete positions')
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--sizes', type=float, nargs='+', default=[0, 1, 4, 16, 64], help='table sizes in MB, 0 searches without a table')
+    args = parser.parse_args()
+    fens = args.fen or [gameBoard.board.startingFen, 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1']
+
+    for sizeInMB in args.sizes:
+        nodes = 0
+        elapsed = 0
+        for fen in fens:
+            chessBoard = gameBoard.board(False, fen)
+            chessBoard.transpositionTable = TranspositionTable(sizeInMB) if sizeInMB > 0 else None
+            result = search.Searcher(chessBoard, args.depth).search()
+            nodes += result.nodes
+            elapsed += result.elapsed
+            print(f"{sizeInMB:>6g} MB  {result}")
+        print(f"{sizeInMB:>6g} MB  total nodes {nodes}  time {elapsed:.2f}s\n")
@@ -0,0 +1,184 @@
+import sys
+import threading
+
+import gameBoard
+import moveEncoding
+import search
+import transpositionTable
+
+# Universal Chess Interface over stdin/stdout, so the engine can be run by chess GUIs and match runners.
+# the search runs on its own thread, the input thread keeps reading so stop and ponderhit act right away
+
+engineName = 'Python-Chess-Engine'
+engineAuthor = 'GitDanielR'
+defaultMovesToGo = 30       # moves the remaining clock is shared over when the GUI doesn't say
+moveOverhead = 0.05         # seconds kept back per move for communication lag
+maxHashSizeMB = 1024
+
+# seconds to spend on this move from the go command's clock, None without one
+def allocateTime(goParameters, whiteToMove):
+    if 'movetime' in goParameters:
+        return goParameters['movetime'] / 1000
+    remaining = goParameters.get('wtime' if whiteToMove else 'btime')
+    if remaining is None:
+        return None
+    increment = goParameters.get('winc' if whiteToMove else 'binc', 0)
+    movesToGo = goParameters.get('movestogo', defaultMovesToGo)
+    allocated = (remaining / max(movesToGo, 1) + increment * 0.75) / 1000
+    return max(min(allocated, remaining / 1000 - moveOverhead), 0.01)
+
+def scoreToUci(score):
+    if search.isMateScore(score):
+        matePlies = search.mateScore - abs(score)
+        return f"mate {(matePlies + 1) // 2 if score > 0 else -(matePlies // 2)}"
+    return f"cp {score}"
+
+class UciEngine:
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.outputLock = threading.Lock()
+        self.board = gameBoard.board(False)
+        self.searcher = None
+        self.searchThread = None
+        # set once the bestmove may be sent, infinite and ponder searches hold it back until stop/ponderhit
+        self.mayReport = threading.Event()
+        self.ponderTime = None  # the time limit a ponder search switches to on ponderhit
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def run(self, commands=sys.stdin):
+        for line in commands:
+            if not self.handleCommand(line):
+                break
+        self.stopSearch()
+
+    # returns False on quit
+    def handleCommand(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, arguments = tokens[0], tokens[1:]
+
+        if command == 'uci':
+            self.send(f"id name {engineName}")
+            self.send(f"id author {engineAuthor}")
+            self.send(f"option name Hash type spin default {transpositionTable.defaultSizeMB} min 0 max {maxHashSizeMB}")
+            self.send("option name Ponder type check default false")
+            self.send("uciok")
+        elif command == 'isready':
+            self.send("readyok")
+        elif command == 'setoption':
+            self.stopSearch()
+            self.setOption(arguments)
+        elif command == 'ucinewgame':
+            self.stopSearch()
+            if self.board.transpositionTable is not None:
+                self.board.transpositionTable.clear()
+        elif command == 'position':
+            self.stopSearch()
+            self.setPosition(arguments)
+        elif command == 'go':
+            self.stopSearch()
+            self.startSearch(arguments)
+        elif command == 'stop':
+            self.stopSearch()
+        elif command == 'ponderhit':
+            self.ponderHit()
+        elif command == 'quit':
+            return False
+        return True
+
+    def setOption(self, arguments):
+        name = ' '.join(arguments[1:arguments.index('value')] if 'value' in arguments else arguments[1:])
+        value = ' '.join(arguments[arguments.index('value')+1:]) if 'value' in arguments else ''
+        if name.lower() == 'hash':
+            try:
+                sizeInMB = float(value)
+                if not 0 <= sizeInMB <= maxHashSizeMB:
+                    raise ValueError
+            except ValueError:
+                self.send(f"info string bad Hash value {value!r}, keeping the current table")
+                return
+            self.board.transpositionTable = transpositionTable.TranspositionTable(sizeInMB) if sizeInMB > 0 else None
+
+    # position [startpos | fen <fen>] [moves <move> ...]
+    def setPosition(self, arguments):
+        movesIndex = arguments.index('moves') if 'moves' in arguments else len(arguments)
+        if arguments and arguments[0] == 'fen':
+            fen = ' '.join(arguments[1:movesIndex])
+        else:
+            fen = gameBoard.board.startingFen
+        try:
+            self.board.initBoard(fen)
+        except ValueError as error:
+            self.send(f"info string {error}")
+            self.board.initBoard()
+            return
+
+        for moveString in arguments[movesIndex+1:]:
+            legalMoves = {moveEncoding.moveToString(legalMove): legalMove
+                          for pieceMoves in self.board.legalMoves.values() for legalMove in pieceMoves}
+            if moveString not in legalMoves:
+                self.send(f"info string illegal move {moveString}")
+                break
+            self.board.makeMove(legalMoves[moveString])
+
+    def startSearch(self, arguments):
+        goParameters = {}
+        for i, token in enumerate(arguments):
+            if token in ('wtime', 'btime', 'winc', 'binc', 'movestogo', 'depth', 'nodes', 'movetime'):
+                value = arguments[i+1] if i+1 < len(arguments) else ''
+                try:
+                    goParameters[token] = int(value)
+                except ValueError:
+                    self.send(f"info string bad go value {value!r} for {token}, ignored")
+        pondering = 'ponder' in arguments
+        maxTime = allocateTime(goParameters, self.board.whiteToMove)
+
+        # pondering searches without a clock until ponderhit hands it the time it would have had
+        self.ponderTime = maxTime if pondering else None
+        self.searcher = search.Searcher(self.board, goParameters.get('depth', search.maxSearchDepth), goParameters.get('nodes'),
+                                        None if pondering else maxTime, onIteration=self.sendInfo)
+        if pondering or 'infinite' in arguments:
+            self.mayReport.clear()
+        else:
+            self.mayReport.set()
+        self.searchThread = threading.Thread(target=self.searchAndReport, args=(self.searcher,), daemon=True)
+        self.searchThread.start()
+
+    def searchAndReport(self, searcher):
+        result = searcher.search()
+        self.mayReport.wait()
+        bestMove = moveEncoding.moveToString(result.bestMove) if result.bestMove != moveEncoding.noMove else '0000'
+        if len(result.principalVariation) > 1:
+            self.send(f"bestmove {bestMove} ponder {moveEncoding.moveToString(result.principalVariation[1])}")
+        else:
+            self.send(f"bestmove {bestMove}")
+
+    def sendInfo(self, result):
+        pv = ' '.join(moveEncoding.moveToString(pvMove) for pvMove in result.principalVariation)
+        self.send(f"info depth {result.depth} score {scoreToUci(result.score)} nodes {result.nodes + result.qnodes} "
+                  f"nps {result.nodesPerSecond} time {int(result.elapsed * 1000)} hashfull {result.hashFull} pv {pv}")
+
+    # the opponent played the expected move, keep searching but on our own clock now
+    def ponderHit(self):
+        if self.searcher is None:
+            return
+        self.searcher.setTimeLimit(self.ponderTime)
+        self.mayReport.set()
+
+    # waits for the bestmove to be sent, so the board is free again
+    def stopSearch(self):
+        if self.searchThread is None:
+            return
+        self.searcher.stop()
+        self.mayReport.set()
+        self.searchThread.join()
+        self.searchThread = None
+        self.searcher = None
+
+if __name__ == "__main__":
+    UciEngine().run()
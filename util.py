@@ -18,6 +18,15 @@ def mousePositionToSquareIndex(position, tileSize):
     coords = mousePositionToRelativeCoordinate(position, tileSize)
     return relativeCoordinatesToSquareIndex(coords)
 
+def squareIndexToSquareName(index):
+    file,rank = squareIndexToRelativeCoordinate(index)
+    return 'abcdefgh'[file] + str(8 - rank)
+
+def squareNameToSquareIndex(squareName):
+    file = 'abcdefgh'.index(squareName[0])
+    rank = 8 - int(squareName[1])
+    return relativeCoordinatesToSquareIndex((file, rank))
+
 def fileRankInbounds(file, rank):
     return (0 <= file < 8 and 0 <= rank < 8)
 
@@ -0,0 +1,35 @@
+import random
+
+# seeded so every process (search workers, the transposition table on disk) agrees on the keys
+randomGenerator = random.Random(0x5A0B1257)
+
+def randomKey():
+    return randomGenerator.getrandbits(64)
+
+# pieceKeys[pieceListIndex][squareIndex], indexed like board.pieceLists
+pieceKeys = [[randomKey() for _ in range(64)] for _ in range(12)]
+blackToMoveKey = randomKey()
+castlingRightKeys = [randomKey() for _ in range(4)]
+enPassantFileKeys = [randomKey() for _ in range(8)]
+
+# one key per castling rights mask, so a change costs a single xor
+castlingKeys = [0] * 16
+for castlingRights in range(16):
+    for rightIndex in range(4):
+        if castlingRights & (1 << rightIndex):
+            castlingKeys[castlingRights] ^= castlingRightKeys[rightIndex]
+
+def enPassantKey(enPassantSquare):
+    return enPassantFileKeys[enPassantSquare % 8] if enPassantSquare >= 0 else 0
+
+# from scratch, the board keeps its key up to date incrementally
+def computeHash(chessBoard):
+    hashKey = 0
+    for pieceListIndex, pieceList in enumerate(chessBoard.pieceLists):
+        for squareIndex in pieceList:
+            hashKey ^= pieceKeys[pieceListIndex][squareIndex]
+    if not chessBoard.whiteToMove:
+        hashKey ^= blackToMoveKey
+    hashKey ^= castlingKeys[chessBoard.castlingRights.rights]
+    hashKey ^= enPassantKey(chessBoard.enPassantSquare)
+    return hashKey